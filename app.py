@@ -1,18 +1,44 @@
 # app.py
 
 import os
+import atexit
+import threading
+import time
+import json
 
 import cv2
 import base64
-from flask import Flask, render_template, Response, request, redirect, flash, session
+import click
+from functools import partial
+from flask import Flask, render_template, Response, request, redirect, flash, session, send_file, abort
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from models.gear_detection import gear_detection
 from models.fire_detection import fire_detection
-from models.pose import detect_l_pose  # ✅ Changed: import correct function for pose detection
+from models.pose import detect_l_pose, pose_smoother, load_mediapipe  # ✅ Changed: import correct function for pose detection
 from models.restricted_zone import restricted_zone_detection  # ✅ New: import restricted zone detection
+from models.camera_worker import camera_worker, worker_registry, STREAM_TIERS
+from models.detector_plan import detector_plan
+from models.alert_cooldown import alert_cooldown
+from models.alert_writer import alert_writer
+from models.snapshot_store import snapshot_store
+from models.process_backend import local_backend, process_backend
+from models.model_registry import model_registry
+from models.metrics import metrics_registry, camera_metrics
+from models.audio_dispatcher import alert_sounds, local_sound_sink, webhook_sink, null_sink
+from models.zones import parse_zones, zone_set, ZONE_CHECKS
+from models.clip_recorder import frame_ring, clip_recorder, clip_writer
+from models.batch_analysis import ANALYSIS_DETECTORS, analyze_videos, detection_file, measure_prefilter, video_files
+from models.fire_prefilter import fire_prefilter
+from models.model_export import MODEL_FORMATS, resolve_weights, supports_batching, export_model, check_parity, list_images
+
+# ✅ Optional: binary WebSocket live view (pip install flask-sock)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'the random string'
@@ -21,6 +47,91 @@ app.config["SQLALCHEMY_BINDS"] = {
     "cams": "sqlite:///cams.db",
     "alerts": "sqlite:///alerts.db"
 }
+# ✅ Frames from all cameras are batched into one forward pass per model
+app.config['INFERENCE_MAX_BATCH'] = int(os.environ.get('INFERENCE_MAX_BATCH', 8))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+# ✅ "thread" runs the models in this process, "process" shards cameras across
+# INFERENCE_WORKERS processes (default: one per 4 cores) fed through shared memory
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'thread')
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', 0)) or None
+# ✅ A detector whose model has not answered within INFERENCE_TIMEOUT seconds is
+# skipped for that frame instead of stalling its camera
+app.config['INFERENCE_TIMEOUT'] = float(os.environ.get('INFERENCE_TIMEOUT', 30))
+# ✅ "pt" (PyTorch) or a CPU export made by `flask export-models`: "onnx",
+# "onnx-int8", "openvino" or "openvino-int8"
+app.config['MODEL_FORMAT'] = os.environ.get('MODEL_FORMAT', 'pt')
+# ✅ Frame skipping adapts to measured latency between these bounds; per-detector
+# rates run a model only on every n-th processed frame, e.g. "gear_detection:5";
+# for a tracked detector (see TRACKING) the rate sets its keyframe interval
+app.config['FRAME_SKIP_MIN'] = int(os.environ.get('FRAME_SKIP_MIN', 2))
+app.config['FRAME_SKIP_MAX'] = int(os.environ.get('FRAME_SKIP_MAX', 30))
+app.config['DETECTOR_RATES'] = {
+    name: int(every) for name, every in
+    (rate.split(':') for rate in os.environ.get('DETECTOR_RATES', '').split(',') if rate)
+}
+# ✅ Detect-then-track: these detectors run every n-th processed frame (their
+# keyframes, unless DETECTOR_RATES sets one), a tracker moves their boxes in
+# between and each tracked person alerts once; "" turns tracking off
+app.config['TRACKING'] = {
+    name: int(every) for name, every in
+    (entry.split(':') for entry in
+     os.environ.get('TRACKING', 'restricted_zone_breach:3,gear_detection:3').split(',') if entry)
+}
+# ✅ Tracked alerts are still capped at one per camera and type every
+# TRACKED_ALERT_INTERVAL seconds, so id switches cannot flood the alert log
+app.config['TRACKED_ALERT_INTERVAL'] = float(os.environ.get('TRACKED_ALERT_INTERVAL', 10))
+# ✅ Streams and snapshots are drawn at DISPLAY_SIZE ("" keeps the camera's
+# resolution); the models run on the captured frame at their own input size,
+# INFERENCE_SIZE or per detector, e.g. "restricted_zone_breach:320"
+app.config['DISPLAY_SIZE'] = tuple(
+    int(side) for side in os.environ.get('DISPLAY_SIZE', '1000x580').split('x') if side) or None
+app.config['INFERENCE_SIZE'] = int(os.environ.get('INFERENCE_SIZE', 640))
+app.config['INFERENCE_SIZES'] = {
+    name: int(size) for name, size in
+    (entry.split(':') for entry in os.environ.get('INFERENCE_SIZES', '').split(',') if entry)
+}
+# ✅ An L-pose alerts once seen on POSE_SMOOTHING_HITS of a person's last
+# POSE_SMOOTHING_WINDOW pose frames (1 and 1 alert on a single frame)
+app.config['POSE_SMOOTHING_WINDOW'] = int(os.environ.get('POSE_SMOOTHING_WINDOW', 5))
+app.config['POSE_SMOOTHING_HITS'] = int(os.environ.get('POSE_SMOOTHING_HITS', 3))
+# ✅ Models load when the first camera needs them; MODEL_WARMUP ("all" or e.g.
+# "fire,gear") loads some in the background at startup and /health waits for them
+app.config['MODEL_WARMUP'] = [name for name in os.environ.get('MODEL_WARMUP', '').split(',') if name]
+# ✅ /metrics is open unless METRICS_TOKEN is set, then scrapers send it as a bearer token
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# ✅ Live view tiers a viewer can pick with ?tier=, e.g. thumbnails for the dashboard grid
+app.config['STREAM_TIERS'] = STREAM_TIERS
+# ✅ A person breaches a zone when their foot point is inside it ("foot") or their
+# box overlaps the zones by ZONE_MIN_OVERLAP of its area ("overlap")
+app.config['ZONE_CHECK'] = os.environ.get('ZONE_CHECK', 'foot')
+app.config['ZONE_MIN_OVERLAP'] = float(os.environ.get('ZONE_MIN_OVERLAP', 0.3))
+if app.config['ZONE_CHECK'] not in ZONE_CHECKS:
+    raise ValueError(f"ZONE_CHECK must be one of {', '.join(ZONE_CHECKS)}")
+# ✅ FIRE_PREFILTER=1 runs the fire model only on frames with flickering flame
+# colours, and at least every FIRE_PREFILTER_MAX_STALENESS seconds; check its
+# recall on your footage first with `flask measure-fire-prefilter`
+app.config['FIRE_PREFILTER'] = os.environ.get('FIRE_PREFILTER', '0') == '1'
+app.config['FIRE_PREFILTER_MAX_STALENESS'] = float(os.environ.get('FIRE_PREFILTER_MAX_STALENESS', 2))
+app.config['FIRE_PREFILTER_MIN_FLICKER'] = float(os.environ.get('FIRE_PREFILTER_MIN_FLICKER', 0.1))
+# ✅ Alert sounds: "local" speaker, "webhook" (POSTed to ALERT_SOUND_WEBHOOK) or
+# "none" on headless servers; each alert type sounds at most once per interval
+app.config['ALERT_SOUND_SINK'] = os.environ.get('ALERT_SOUND_SINK', 'local')
+app.config['ALERT_SOUND_WEBHOOK'] = os.environ.get('ALERT_SOUND_WEBHOOK')
+app.config['ALERT_SOUND_INTERVAL'] = float(os.environ.get('ALERT_SOUND_INTERVAL', 5))
+# ✅ Alerts are queued and written in batches off the streaming thread
+app.config['ALERT_QUEUE_SIZE'] = int(os.environ.get('ALERT_QUEUE_SIZE', 256))
+app.config['ALERT_BATCH_SIZE'] = int(os.environ.get('ALERT_BATCH_SIZE', 32))
+# ✅ Alert snapshots live on disk, the alert row only keeps their key
+app.config['SNAPSHOT_DIR'] = os.environ.get('SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots'))
+# ✅ Alerts get a clip of CLIP_PRE_ROLL seconds before and CLIP_POST_ROLL after
+# them, cut from a per-camera buffer of at most CLIP_BUFFER_MB; 0 and 0 turns clips off.
+# Clips waiting for their post-roll hold at most CLIP_PENDING_MB of pre-roll in total
+app.config['CLIP_DIR'] = os.environ.get('CLIP_DIR', os.path.join(app.instance_path, 'clips'))
+app.config['CLIP_PRE_ROLL'] = float(os.environ.get('CLIP_PRE_ROLL', 5))
+app.config['CLIP_POST_ROLL'] = float(os.environ.get('CLIP_POST_ROLL', 5))
+app.config['CLIP_BUFFER_MB'] = float(os.environ.get('CLIP_BUFFER_MB', 16))
+app.config['CLIP_WIDTH'] = int(os.environ.get('CLIP_WIDTH', 640))
+app.config['CLIP_PENDING_MB'] = float(os.environ.get('CLIP_PENDING_MB', 64))
 
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
@@ -43,20 +154,196 @@ class Camera(db.Model):
     pose_alert = db.Column(db.Boolean, default=False)
     restricted_zone = db.Column(db.Boolean, default=False)
     safety_gear_detection = db.Column(db.Boolean, default=False)
-    region = db.Column(db.Boolean, default=False)
+    region = db.Column(db.Boolean, default=False)  # unused, superseded by zones
+    zones = db.Column(db.Text)  # ✅ restricted zone polygons as JSON, see models.zones
+    motion_gate = db.Column(db.Boolean, default=False)  # ✅ skip detection on static frames
+    motion_max_staleness = db.Column(db.Float, default=5.0)  # seconds between forced checks
+
+    @property
+    def zone_polygons(self):
+        return json.loads(self.zones) if self.zones else []
 
 class Alert(db.Model):  
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  
     date_time = db.Column(db.DateTime)
     alert_type = db.Column(db.String(50))
-    frame_snapshot = db.Column(db.LargeBinary)
-
-# ✅ Model Initializations
-fire_det = fire_detection("models/fire.pt", conf=0.60)
-gear_det = gear_detection("models/gear.pt")
-restricted_zone_det = restricted_zone_detection(conf=0.6)  # ✅ New: Initialize restricted zone detection
+    frame_snapshot = db.Column(db.LargeBinary)  # legacy rows only, see migrate-snapshots
+    cam_id = db.Column(db.String(100))
+    snapshot_key = db.Column(db.String(64), index=True)
+    clip_key = db.Column(db.String(32))  # ✅ pre/post-roll clip, written shortly after the alert
+
+    # ✅ Notifications are listed newest first per user, optionally by type or camera
+    __table_args__ = (
+        db.Index('ix_alert_user_time', 'user_id', 'date_time', 'id'),
+        db.Index('ix_alert_user_type_time', 'user_id', 'alert_type', 'date_time', 'id'),
+        db.Index('ix_alert_user_cam_time', 'user_id', 'cam_id', 'date_time', 'id'),
+    )
+
+# columns added after the first release, with the DDL used to add them to existing tables
+MIGRATED_COLUMNS = {
+    Camera: [('motion_gate', 'BOOLEAN DEFAULT 0'), ('motion_max_staleness', 'FLOAT DEFAULT 5.0'),
+             ('zones', 'TEXT')],
+    Alert: [('cam_id', 'VARCHAR(100)'), ('snapshot_key', 'VARCHAR(64)'), ('clip_key', 'VARCHAR(32)')],
+}
 
+def migrate_db():
+    """✅ Create missing tables, then add columns and indexes introduced after the first release"""
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for model, added in MIGRATED_COLUMNS.items():
+            columns = {column['name'] for column in inspector.get_columns(model.__tablename__)}
+            for name, ddl in added:
+                if name not in columns:
+                    conn.execute(db.text(f'ALTER TABLE {model.__tablename__} ADD COLUMN {name} {ddl}'))
+        for index in Alert.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+with app.app_context():
+    migrate_db()
+
+def latest_alert_times():
+    """newest alert time per (user, camera, alert type), used to seed the cooldowns"""
+    with app.app_context():
+        rows = db.session.query(Alert.user_id, Alert.cam_id, Alert.alert_type, db.func.max(Alert.date_time)) \
+            .group_by(Alert.user_id, Alert.cam_id, Alert.alert_type).all()
+    return [((user_id, cam_id, alert_type), last) for user_id, cam_id, alert_type, last in rows]
+
+ALERT_TYPES = ("fire_detection", "gear_detection", "restricted_zone_breach", "pose_alert")
+
+# ✅ One alert per user, camera and type per minute, checked in memory
+alert_cooldowns = alert_cooldown(window=timedelta(minutes=1))
+try:
+    alert_cooldowns.seed(latest_alert_times())
+except Exception as e:
+    print(f"Error seeding alert cooldowns: {e}")
+
+# tracked detectors alert once per track, within a shorter per-camera cap
+tracked_alert_limits = alert_cooldown(window=timedelta(seconds=app.config['TRACKED_ALERT_INTERVAL']))
+
+def alert_key(alert):
+    return (alert["user_id"], alert["cam_id"], alert["alert_type"])
+
+def alert_limiter(alert):
+    return tracked_alert_limits if alert.get("tracked") else alert_cooldowns
+
+snapshots = snapshot_store(app.config['SNAPSHOT_DIR'])
+clips = clip_writer(app.config['CLIP_DIR'], pre_roll=app.config['CLIP_PRE_ROLL'],
+                    post_roll=app.config['CLIP_POST_ROLL'],
+                    max_pending_bytes=int(app.config['CLIP_PENDING_MB'] * 2 ** 20))
+
+metrics = metrics_registry()
+
+def camera_label(camera):
+    """the metrics label of a Camera row: its id, since cam_id is the camera's address"""
+    return str(camera.id)
+
+def save_alerts(batch):
+    """store the snapshots of a batch of queued alerts, then the rows with one commit"""
+    start = time.perf_counter()
+    with app.app_context():
+        for alert in batch:
+            db.session.add(Alert(date_time=alert["date_time"], alert_type=alert["alert_type"],
+                                 snapshot_key=snapshots.put(alert["frame"]), clip_key=alert.get("clip_key"),
+                                 user_id=alert["user_id"], cam_id=alert["cam_id"]))
+        db.session.commit()
+    metrics.histogram("alert_write_seconds", "Time to store one batch of alerts and their snapshots.").observe(
+        time.perf_counter() - start)
+
+alert_queue = alert_writer(save_alerts, max_queue=app.config['ALERT_QUEUE_SIZE'],
+                           max_batch=app.config['ALERT_BATCH_SIZE'],
+                           on_failure=lambda alert: alert_limiter(alert).release(alert_key(alert), alert["date_time"]))
+atexit.register(alert_queue.close)
+
+# ✅ One audio thread for every detector's alert sounds
+if app.config['ALERT_SOUND_SINK'] == 'webhook':
+    if not app.config['ALERT_SOUND_WEBHOOK']:
+        raise ValueError("ALERT_SOUND_SINK=webhook needs ALERT_SOUND_WEBHOOK")
+    alert_sounds.sink = webhook_sink(app.config['ALERT_SOUND_WEBHOOK'])
+elif app.config['ALERT_SOUND_SINK'] == 'none':
+    alert_sounds.sink = null_sink()
+elif app.config['ALERT_SOUND_SINK'] == 'local':
+    alert_sounds.sink = local_sound_sink()
+else:
+    raise ValueError("ALERT_SOUND_SINK must be local, webhook or none")
+alert_sounds.min_interval = app.config['ALERT_SOUND_INTERVAL']
+
+# ✅ Model Initializations (weights load on first use)
+MODEL_WEIGHTS = {"fire": "models/fire.pt", "gear": "models/gear.pt", "restricted_zone": "yolov8n.pt"}
+if app.config['MODEL_FORMAT'] not in MODEL_FORMATS:
+    raise ValueError(f"MODEL_FORMAT must be one of {', '.join(MODEL_FORMATS)}")
+model_files = {name: resolve_weights(weights, app.config['MODEL_FORMAT']) for name, weights in MODEL_WEIGHTS.items()}
+inference_size = lambda alert_name: app.config['INFERENCE_SIZES'].get(alert_name, app.config['INFERENCE_SIZE'])
+fire_det = fire_detection(model_files["fire"], conf=0.60, imgsz=inference_size("fire_detection"))
+gear_det = gear_detection(model_files["gear"], imgsz=inference_size("gear_detection"))
+restricted_zone_det = restricted_zone_detection(model_files["restricted_zone"], conf=0.6,
+                                                imgsz=inference_size("restricted_zone_breach"))  # ✅ New: Initialize restricted zone detection
+pose_smoothing = pose_smoother(window=app.config['POSE_SMOOTHING_WINDOW'],
+                               min_hits=app.config['POSE_SMOOTHING_HITS'])
+detectors = {"restricted_zone": restricted_zone_det, "fire": fire_det, "gear": gear_det,
+             "pose": partial(detect_l_pose, smoothing=pose_smoothing)}
+
+inference_backend = None
+inference_backend_lock = threading.Lock()
+
+def get_inference_backend():
+    """
+    create the configured backend on first use, so processes spawned by the
+    process backend can import this module without starting a pool of their own
+    """
+    global inference_backend
+    with inference_backend_lock:
+        if inference_backend is None:
+            if app.config['INFERENCE_BACKEND'] == 'process':
+                inference_backend = process_backend({
+                    "restricted_zone_breach": restricted_zone_det.model_path,
+                    "fire_detection": fire_det.model_path,
+                    "gear_detection": gear_det.model_path,
+                }, workers=app.config['INFERENCE_WORKERS'],
+                   max_batch=app.config['INFERENCE_MAX_BATCH'] if all(map(supports_batching, model_files.values())) else 1)
+            else:
+                for detector in (fire_det, gear_det, restricted_zone_det):
+                    # OpenVINO exports take one frame per call
+                    max_batch = app.config['INFERENCE_MAX_BATCH'] if supports_batching(detector.model_path) else 1
+                    detector.enable_batching(max_batch=max_batch,
+                                             max_wait=app.config['INFERENCE_MAX_WAIT_MS'] / 1000)
+                inference_backend = local_backend()
+            atexit.register(inference_backend.close)
+        return inference_backend
+
+def yolo_loader(detector):
+    def load():
+        if app.config['INFERENCE_BACKEND'] == 'process':
+            # the worker processes load the weights; ready once all of them have
+            get_inference_backend().wait_ready()
+        else:
+            detector.model
+    return load
+
+detector_models = model_registry()
+detector_models.register("restricted_zone", yolo_loader(restricted_zone_det))
+detector_models.register("fire", yolo_loader(fire_det))
+detector_models.register("gear", yolo_loader(gear_det))
+detector_models.register("pose", load_mediapipe)
+if app.config['MODEL_WARMUP'] == ['all']:
+    app.config['MODEL_WARMUP'] = detector_models.names
+detector_models.warm(app.config['MODEL_WARMUP'])
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/health')
+def health():
+    # ✅ 503 until the models named in MODEL_WARMUP are loaded, so a new
+    # instance only takes traffic once it can run them
+    ready = detector_models.ready(app.config['MODEL_WARMUP'])
+    return {"ready": ready, "models": detector_models.status()}, 200 if ready else 503
 
 @app.route('/')
 def index():
@@ -116,7 +403,7 @@ def register():
 @login_required
 def dash_page():
     cameras = Camera.query.filter_by(user_id=current_user.id).all()
-    return render_template('dash.html', cameras=cameras)
+    return render_template('dash.html', cameras=cameras, websocket=sock is not None)
 
 @app.route("/manage_camera")
 @login_required
@@ -133,6 +420,18 @@ def getting_cam_details():
         pose_bool = "pose_alert" in request.form
         r_bool = "R_zone" in request.form
         s_gear_bool = "Safety_gear" in request.form
+        motion_bool = "motion_gate" in request.form
+        try:
+            staleness = max(float(request.form.get('motion_max_staleness') or 5.0), 0.5)
+        except ValueError:
+            staleness = 5.0
+        # an empty field keeps a camera's zones, "[]" clears them
+        zones_text = request.form.get('zones', '').strip()
+        try:
+            polygons = parse_zones(zones_text) if zones_text else None
+        except ValueError as e:
+            flash(f"Zones not saved: {e}")
+            return redirect("/manage_camera")
 
         camera = Camera.query.filter_by(cam_id=camid, user_id=current_user.id).first()
 
@@ -141,35 +440,321 @@ def getting_cam_details():
             camera.pose_alert = pose_bool
             camera.restricted_zone = r_bool
             camera.safety_gear_detection = s_gear_bool
+            camera.motion_gate = motion_bool
+            camera.motion_max_staleness = staleness
+            if polygons is not None:
+                camera.zones = json.dumps(polygons) if polygons else None
         else:
             camera = Camera(user_id=current_user.id, cam_id=camid, fire_detection=fire_bool,
                             pose_alert=pose_bool, restricted_zone=r_bool,
-                            safety_gear_detection=s_gear_bool)
+                            safety_gear_detection=s_gear_bool, motion_gate=motion_bool,
+                            motion_max_staleness=staleness, zones=json.dumps(polygons) if polygons else None)
 
         db.session.add(camera)
         db.session.commit()
+
+        # running feeds pick up the new flags without dropping their viewers
+        worker = camera_workers.find((current_user.id, camid))
+        if worker:
+            worker.reconfigure(camera_pipeline(camera))
     return redirect("/manage_camera")
 
+NOTIFICATIONS_PAGE_SIZE = 25
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+
+def encode_cursor(alert):
+    raw = f"{alert.date_time.isoformat()}|{alert.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        date_time, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date_time), int(alert_id)
+    except Exception:
+        abort(400, "Invalid cursor")
+
+def parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, f"Invalid time: {value}")
+
+def query_alerts(user_id, args):
+    """
+    one page of a user's alerts, newest first, filtered by the request args
+    (type, cam, since, until) and continued from an opaque `cursor`.
+    Returns the alerts and the cursor of the next page (None on the last page).
+    """
+    limit = min(max(args.get('limit', NOTIFICATIONS_PAGE_SIZE, type=int), 1), NOTIFICATIONS_MAX_PAGE_SIZE)
+    query = Alert.query.options(db.defer(Alert.frame_snapshot)).filter(Alert.user_id == user_id)
+
+    if args.get('type'):
+        query = query.filter(Alert.alert_type == args['type'])
+    if args.get('cam'):
+        query = query.filter(Alert.cam_id == args['cam'])
+    since, until = parse_time(args.get('since')), parse_time(args.get('until'))
+    if since:
+        query = query.filter(Alert.date_time >= since)
+    if until:
+        query = query.filter(Alert.date_time < until)
+
+    # keyset pagination: continue strictly after the last row of the previous page
+    if args.get('cursor'):
+        query = query.filter(db.tuple_(Alert.date_time, Alert.id) < decode_cursor(args['cursor']))
+
+    alerts = query.order_by(Alert.date_time.desc(), Alert.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(alerts[limit - 1]) if len(alerts) > limit else None
+    return alerts[:limit], next_cursor
+
 @app.route('/notifications')
 @login_required
 def notifications():
-    alerts = Alert.query.filter_by(user_id=current_user.id).order_by(Alert.date_time.desc()).all()
-    for alert in alerts:
-        alert.frame_snapshot = base64.b64encode(alert.frame_snapshot).decode('utf-8')
-    return render_template('notifications.html', alerts=alerts)
+    # ✅ Snapshot BLOBs are only loaded for legacy rows that still have one
+    alerts, next_cursor = query_alerts(current_user.id, request.args)
+    filters = {name: request.args[name] for name in ('type', 'cam', 'since', 'until', 'limit') if request.args.get(name)}
+    cameras = Camera.query.filter_by(user_id=current_user.id).all()
+    return render_template('notifications.html', alerts=alerts, next_cursor=next_cursor,
+                           filters=filters, cameras=cameras, alert_types=ALERT_TYPES)
+
+@app.route('/api/notifications')
+@login_required
+def notifications_api():
+    alerts, next_cursor = query_alerts(current_user.id, request.args)
+    return {
+        "alerts": [{
+            "id": alert.id,
+            "alert_type": alert.alert_type,
+            "cam_id": alert.cam_id,
+            "date_time": alert.date_time.isoformat(),
+            "snapshot_url": f"/snapshots/{alert.snapshot_key}" if alert.snapshot_key else None,
+            "thumbnail_url": f"/snapshots/{alert.snapshot_key}/thumb" if alert.snapshot_key else None,
+            "clip_url": f"/clips/{alert.clip_key}" if clip_state(alert.clip_key) == "ready" else None,
+        } for alert in alerts],
+        "next_cursor": next_cursor,
+    }
+
+@app.template_filter('b64encode')
+def b64encode_filter(data):
+    return base64.b64encode(data or b'').decode('utf-8')
+
+def send_snapshot(key, thumb):
+    if not snapshots.valid_key(key):
+        abort(404)
+    if not Alert.query.filter_by(snapshot_key=key, user_id=current_user.id).first():
+        abort(404)
+    path = snapshots.path(key, thumb=thumb)
+    if not os.path.exists(path):
+        abort(404)
+
+    # Content-addressed files never change, so the key is a perfect ETag
+    response = send_file(path, mimetype='image/jpeg', etag=f"{key}-thumb" if thumb else key,
+                         max_age=365 * 24 * 3600, conditional=True)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/snapshots/<string:key>')
+@login_required
+def snapshot(key):
+    return send_snapshot(key, thumb=False)
+
+@app.route('/snapshots/<string:key>/thumb')
+@login_required
+def snapshot_thumb(key):
+    return send_snapshot(key, thumb=True)
+
+@app.template_global()
+def clip_state(key):
+    return clips.state(key)
+
+@app.route('/clips/<string:key>')
+@login_required
+def clip(key):
+    if not clips.valid_key(key) or not Alert.query.filter_by(clip_key=key, user_id=current_user.id).first():
+        abort(404)
+    path = clips.path(key)
+    if not os.path.exists(path):
+        abort(404)  # still recording its post-roll
+    response = send_file(path, mimetype='video/mp4', conditional=True, max_age=365 * 24 * 3600)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
 
 @app.route('/delete_notification/<int:id>')         
 @login_required
 def delete_notification(id):
     alert = Alert.query.filter_by(id=id, user_id=current_user.id).first()
+    key = alert.snapshot_key
+    if clips.valid_key(alert.clip_key):
+        clips.delete(alert.clip_key)
     db.session.delete(alert)
     db.session.commit()
+
+    # identical snapshots share one file, only drop it with its last alert
+    if key and not Alert.query.filter_by(snapshot_key=key).first():
+        snapshots.delete(key)
     return redirect("/notifications")
 
+@app.cli.command('migrate-snapshots')
+def migrate_snapshots():
+    """Move snapshot BLOBs of existing alerts into the snapshot store."""
+    moved = 0
+    while True:
+        alerts = Alert.query.filter(Alert.snapshot_key.is_(None), Alert.frame_snapshot.isnot(None)).limit(500).all()
+        if not alerts:
+            break
+        for alert in alerts:
+            try:
+                alert.snapshot_key = snapshots.put_bytes(alert.frame_snapshot)
+            except ValueError as e:
+                print(f"Skipping alert {alert.id}: {e}")
+                alert.snapshot_key = ''
+            alert.frame_snapshot = None
+        db.session.commit()
+        moved += len(alerts)
+    # give the space of the moved BLOBs back to the filesystem
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(db.text('VACUUM'))
+    print(f"Moved {moved} snapshots to {snapshots.root}")
+
+@app.cli.command('export-models')
+@click.option('--format', 'model_format', type=click.Choice(MODEL_FORMATS[1:]), default='onnx')
+@click.option('--imgsz', default=640, help='Input size of the exported models.')
+@click.option('--data', default=None, help='Dataset yaml used to calibrate OpenVINO INT8.')
+@click.option('--images', default=None, help='Folder of sample images used to check parity (and calibrate ONNX INT8).')
+@click.option('--min-recall', default=0.95, help='Fail if an export finds fewer of the PyTorch detections than this.')
+def export_models(model_format, imgsz, data, images, min_recall):
+    """Export fire.pt, gear.pt and yolov8n.pt for CPU inference and check their accuracy."""
+    failed = []
+    for name, weights in MODEL_WEIGHTS.items():
+        path = export_model(weights, model_format, imgsz=imgsz, data=data, calibration=images)
+        print(f"Exported {weights} -> {path}")
+        if not images:
+            continue
+        report = check_parity(weights, model_format, list_images(images))
+        print(f"  {report['images']} images: recall {report['recall']:.3f}, precision {report['precision']:.3f}, "
+              f"mean conf delta {report['mean_conf_delta']:.3f}, "
+              f"{report['reference_ms']:.1f} ms -> {report['exported_ms']:.1f} ms per image")
+        if report['recall'] < min_recall:
+            failed.append(name)
+    if failed:
+        raise click.ClickException(f"Parity check failed for {', '.join(failed)}")
+    print(f"Set MODEL_FORMAT={model_format} to use the exported models")
+
+@app.cli.command('analyze-videos')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--detectors', default='zone,fire,gear', help='Comma separated: zone, fire, gear, pose.')
+@click.option('--batch-size', default=16, help='Frames per forward pass of each model (OpenVINO exports take one).')
+@click.option('--stride', default=1, help='Analyse every n-th frame.')
+@click.option('--threads', default=None, type=int, help='Videos decoded at once (default: one per core).')
+@click.option('--output', default=None, help='Write detections to this .parquet or .csv file instead of the alert store.')
+@click.option('--user-id', default=None, type=int, help='User the stored alerts belong to.')
+@click.option('--cam-id', default=None, help='Camera id stored with the alerts (default: the video file name).')
+@click.option('--zones', 'zones_text', default=None, help='Restricted zone polygons as JSON, as on the camera page.')
+@click.option('--cooldown', default=60.0, help='Seconds of footage between two stored alerts of one type.')
+def analyze_videos_command(paths, detectors, batch_size, stride, threads, output, user_id, cam_id, zones_text,
+                           cooldown):
+    """Scan recorded footage and store its alerts, or write every detection to a file.
+
+    Alerts are dated from the video's modification time plus the frame's offset.
+    """
+    names = [name for name in detectors.split(',') if name]
+    unknown = set(names) - set(ANALYSIS_DETECTORS)
+    if unknown:
+        raise click.BadParameter(f"unknown detector(s) {', '.join(sorted(unknown))}", param_hint='--detectors')
+    if output is None and user_id is None:
+        raise click.UsageError("Pass --user-id to store alerts, or --output to write a detections file")
+    files = video_files(paths)
+    if not files:
+        raise click.ClickException("No videos found")
+    try:
+        zones = zone_set(parse_zones(zones_text), check=app.config['ZONE_CHECK'],
+                         min_overlap=app.config['ZONE_MIN_OVERLAP']) or None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--zones')
+
+    by_name = {"zone": restricted_zone_det, "fire": fire_det, "gear": gear_det}
+    stages = [(ANALYSIS_DETECTORS[name], by_name[name]) for name in names if name in by_name]
+    pose = partial(detect_l_pose, smoothing=pose_smoother(window=app.config['POSE_SMOOTHING_WINDOW'],
+                                                          min_hits=app.config['POSE_SMOOTHING_HITS'])) \
+        if "pose" in names else None
+    alert_sounds.sink = null_sink()  # offline runs stay quiet
+
+    writer = detection_file(output) if output else None
+    pending, last_alert, stored = [], {}, [0]
+
+    def store(item, alert_type, boxes, rows):
+        if writer is not None:
+            writer.add(item.video, item.index, item.seconds, alert_type, rows)
+            return
+        key = (item.video, alert_type)
+        if key in last_alert and item.seconds - last_alert[key] < cooldown:
+            return
+        last_alert[key] = item.seconds
+        for x1, y1, x2, y2 in boxes:
+            cv2.rectangle(item.frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        started = datetime.fromtimestamp(os.path.getmtime(item.video))
+        pending.append({"user_id": user_id, "cam_id": cam_id or os.path.basename(item.video),
+                        "alert_type": alert_type, "date_time": started + timedelta(seconds=item.seconds),
+                        "frame": item.frame.copy()})
+        if len(pending) >= app.config['ALERT_BATCH_SIZE']:
+            save_alerts(pending)
+            stored[0] += len(pending)
+            pending.clear()
+
+    print(f"Analysing {len(files)} video(s) with {', '.join(names)}")
+    report = analyze_videos(files, stages, pose=pose, persons=restricted_zone_det, batch_size=batch_size,
+                            stride=stride, threads=threads, zones=zones, on_detection=store)
+    if pending:
+        save_alerts(pending)
+        stored[0] += len(pending)
+    if writer is not None:
+        writer.close()
+
+    print(f"{report['frames_analyzed']} of {report['frames_read']} frames from {report['videos']} video(s) "
+          f"in {report['seconds']:.1f} s: {report['fps']:.1f} fps, {report['cpu_percent']:.0f}% of all cores")
+    for stage, seconds in sorted(report['stages'].items()):
+        print(f"  {stage:<32}{seconds:8.2f} s")
+    print(f"{report['positives']} positive detections, "
+          + (f"written to {output}" if writer is not None else f"{stored[0]} alerts stored"))
+    for path in report['failed']:
+        print(f"Could not read {path}")
+
+@app.cli.command('measure-fire-prefilter')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--batch-size', default=16, help='Frames per forward pass of the fire model (OpenVINO exports take one).')
+@click.option('--stride', default=1, help='Measure every n-th frame.')
+@click.option('--threads', default=None, type=int, help='Videos decoded at once (default: one per core).')
+@click.option('--max-staleness', default=None, type=float, help='Seconds between forced model runs (default: FIRE_PREFILTER_MAX_STALENESS).')
+@click.option('--min-flicker', default=None, type=float, help='Flickering share of flame pixels (default: FIRE_PREFILTER_MIN_FLICKER).')
+def measure_fire_prefilter_command(paths, batch_size, stride, threads, max_staleness, min_flicker):
+    """Run the fire model on every frame of recorded footage and report how many
+    of its detections the fire prefilter would have kept, and how often the
+    model would still run.
+    """
+    files = video_files(paths)
+    if not files:
+        raise click.ClickException("No videos found")
+    overrides = {name: value for name, value in
+                 (("max_staleness", max_staleness), ("min_flicker", min_flicker)) if value is not None}
+    report = measure_prefilter(files, fire_det, lambda: fire_prefilter(**fire_prefilter_args(**overrides)),
+                               stride=stride, batch_size=batch_size, threads=threads)
+
+    print(f"{report['frames']} frames, {report['positives']} with fire detections")
+    print(f"  passed by colour/flicker  {report['passed']:8d}  recall {report['filter_recall']:.3f}")
+    print(f"  model would run on        {report['run']:8d}  recall {report['recall']:.3f}")
+    print(f"The fire model would run on {100 * report['run_rate']:.1f}% of the frames")
+    for path in report['failed']:
+        print(f"Could not read {path}")
+
 @app.route('/delete_camera/<int:id>')               
 @login_required
 def delete_camera(id):
     camera = Camera.query.filter_by(id=id, user_id=current_user.id).first()
+    camera_workers.discard((current_user.id, camera.cam_id))
     db.session.delete(camera)
     db.session.commit()
     return redirect("/manage_camera")
@@ -180,42 +765,83 @@ def logout():
     logout_user()
     return redirect('/')
 
+def stream_tier():
+    tier = request.args.get('tier', 'full')
+    if tier not in app.config['STREAM_TIERS']:
+        abort(400)
+    return tier
+
 @app.route('/video_feed/<string:cam_id>')
 @login_required
 def video_feed(cam_id):
+    tier = stream_tier()
     camera = Camera.query.filter_by(cam_id=str(cam_id), user_id=current_user.id).first()
     if camera:
-        flag_r_zone = camera.restricted_zone
-        flag_pose_alert = camera.pose_alert
-        flag_fire = camera.fire_detection
-        flag_gear = camera.safety_gear_detection
-        region = camera.region
-        
         try:
-            return Response(process_frames(str(cam_id), region, flag_r_zone, flag_pose_alert,
-                                           flag_fire, flag_gear, current_user.id), mimetype='multipart/x-mixed-replace; boundary=frame')
+            # ✅ All viewers of a camera share one capture and one detection run
+            worker = camera_workers.get((current_user.id, str(cam_id)))
+            return Response(worker.frames(tier), mimetype='multipart/x-mixed-replace; boundary=frame')
         except:
             return "Something wrong with Cam Details !!"
     else:
         return "Camera details not found."
 
-def add_to_db(results, frame, alert_name, user_id=None):
+sock = Sock(app) if Sock is not None else None
+
+if sock is not None:
+    @sock.route('/ws/video_feed/<string:cam_id>')
+    @login_required
+    def video_feed_ws(ws, cam_id):
+        # ✅ Same frames as /video_feed, one binary JPEG message each
+        tier = stream_tier()
+        camera = Camera.query.filter_by(cam_id=str(cam_id), user_id=current_user.id).first()
+        if camera is None:
+            ws.close(reason=1008, message="Camera details not found.")
+            return
+        try:
+            worker = camera_workers.get((current_user.id, str(cam_id)))
+        except Exception as e:
+            print(f"Error starting camera {cam_id}: {e}")
+            ws.close(reason=1011, message="Something wrong with Cam Details !!")
+            return
+        jpegs = worker.jpegs(tier)
+        try:
+            for data in jpegs:
+                ws.send(data)
+        except Exception:
+            pass  # the viewer went away
+        finally:
+            jpegs.close()
+
+def add_to_db(results, frame, alert_name, user_id=None, cam_id=None, label=None, track_ids=None):
     if results[0]:
         for box in results[1]:
             x1, y1, x2, y2 = box
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
 
-        with app.app_context():
-            latest_alert = Alert.query.filter_by(alert_type=alert_name, user_id=user_id).order_by(Alert.date_time.desc()).first()
-
-            if (latest_alert is None) or ((datetime.now() - latest_alert.date_time) > timedelta(minutes=1)):
-                new_alert = Alert(date_time=datetime.now(), alert_type=alert_name,
-                                  frame_snapshot=cv2.imencode('.jpg', frame)[1].tobytes(),
-                                  user_id=user_id)
-                db.session.add(new_alert)
-                db.session.commit()
-
-def process_frames(camid, region, flag_r_zone=False, flag_pose_alert=False, flag_fire=False, flag_gear=False, user_id=None):
+        alert = {"user_id": user_id, "cam_id": cam_id, "alert_type": alert_name, "date_time": datetime.now(),
+                 "tracked": bool(track_ids)}
+        # tracked detectors raise one alert per new track, under their own shorter cap
+        if not alert_limiter(alert).claim(alert_key(alert), alert["date_time"]):
+            return
+
+        # the stream keeps drawing on frame, so the writer gets its own copy
+        alert["frame"] = frame.copy()
+        worker = camera_workers.find((user_id, cam_id))
+        if worker is not None and worker.recorder is not None:
+            # written in the background once the post-roll is recorded; None if the clip was dropped
+            alert["clip_key"] = clips.request(worker.recorder.ring)
+        labels = {"camera": label, "type": alert_name}
+        if not alert_queue.submit(alert):
+            print(f"Alert queue full, dropped {alert_name} alert")
+            if alert.get("clip_key"):
+                clips.cancel(alert["clip_key"])
+            alert_limiter(alert).release(alert_key(alert), alert["date_time"])
+            metrics.counter("alerts_dropped_total", "Alerts dropped because the write queue was full.").inc(labels)
+            return
+        metrics.counter("alerts_raised_total", "Alerts queued for storage.").inc(labels)
+
+def open_capture(camid):
     if len(camid) == 1:
         cap = cv2.VideoCapture(int(camid))
     else:
@@ -229,57 +855,85 @@ def process_frames(camid, region, flag_r_zone=False, flag_pose_alert=False, flag
     cap.set(cv2.CAP_PROP_FPS, 30)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    return cap
 
-    frame_skip = 2
-    frame_count = 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        frame_count += 1
-        if frame_count % frame_skip != 0:
-            continue
-
-        frame = cv2.resize(frame, (1000, 580))
-
-        # ✅ Restricted Zone Detection (Process first to show zone overlay)
-        if flag_r_zone:
-            # Add zone overlay to show monitoring is active
-            frame = restricted_zone_det.draw_zone_overlay(frame)
-            
-            # Process restricted zone detection
-            results = restricted_zone_det.process(img=frame, flag=flag_r_zone)
-            add_to_db(results=results, frame=frame, alert_name="restricted_zone_breach", user_id=user_id)
-
-        # Fire detection
-        results = fire_det.process(img=frame, flag=flag_fire)
-        add_to_db(results=results, frame=frame, alert_name="fire_detection", user_id=user_id)
-
-        # Gear detection
-        results = gear_det.process(img=frame, flag=flag_gear)
-        add_to_db(results=results, frame=frame, alert_name="gear_detection", user_id=user_id)
-
-        # ✅ L-pose Detection
-        if flag_pose_alert:
-            pose_frame, detected = detect_l_pose(frame.copy())
-            if detected:
-                with app.app_context():
-                    latest_alert = Alert.query.filter_by(alert_type="pose_alert", user_id=user_id).order_by(Alert.date_time.desc()).first()
-                    if (latest_alert is None) or ((datetime.now() - latest_alert.date_time) > timedelta(minutes=1)):
-                        new_alert = Alert(date_time=datetime.now(), alert_type="pose_alert",
-                                          frame_snapshot=cv2.imencode('.jpg', pose_frame)[1].tobytes(),
-                                          user_id=user_id)
-                        db.session.add(new_alert)
-                        db.session.commit()
-            frame = pose_frame
-
-        _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-    cap.release()
+def process_frame(frame, plan, user_id=None, cam_id=None):
+    # the captured frame belongs to the grabber, draw on a display copy
+    start = time.perf_counter()
+    if app.config['DISPLAY_SIZE']:
+        display = cv2.resize(frame, app.config['DISPLAY_SIZE'])
+    else:
+        display = frame.copy()
+    plan.metrics.stage("resize", time.perf_counter() - start)
+    if not plan:
+        return display
+
+    # ✅ Only the stages enabled for this camera run, on the captured frame
+    return plan.run(display, source=frame, on_detection=partial(add_to_db, user_id=user_id, cam_id=cam_id,
+                                                                label=plan.metrics.camera))
+
+def fire_prefilter_args(**overrides):
+    return {"max_staleness": app.config['FIRE_PREFILTER_MAX_STALENESS'],
+            "min_flicker": app.config['FIRE_PREFILTER_MIN_FLICKER'], **overrides}
+
+def camera_pipeline(camera):
+    """compile a camera's current flags into a frame -> frame callable for its worker"""
+    # start loading the camera's models now; its first frames wait for them
+    detector_models.warm(detector_plan.required(camera))
+    plan = detector_plan.from_camera(camera, detectors, rates=app.config['DETECTOR_RATES'],
+                                     tracking=app.config['TRACKING'], zone_check=app.config['ZONE_CHECK'],
+                                     zone_min_overlap=app.config['ZONE_MIN_OVERLAP'],
+                                     fire_filter=fire_prefilter_args() if app.config['FIRE_PREFILTER'] else None,
+                                     result_timeout=app.config['INFERENCE_TIMEOUT'],
+                                     backend=get_inference_backend(),
+                                     metrics=camera_metrics(metrics, camera_label(camera)))
+    return partial(process_frame, plan=plan, user_id=camera.user_id, cam_id=camera.cam_id)
+
+def make_camera_worker(key):
+    user_id, cam_id = key
+    with app.app_context():
+        camera = Camera.query.filter_by(cam_id=cam_id, user_id=user_id).first()
+        pipeline = camera_pipeline(camera)
+        label = camera_label(camera)
+    recorder = None
+    if app.config['CLIP_PRE_ROLL'] or app.config['CLIP_POST_ROLL']:
+        ring = frame_ring(seconds=app.config['CLIP_PRE_ROLL'] + app.config['CLIP_POST_ROLL'] + 1,
+                          max_bytes=int(app.config['CLIP_BUFFER_MB'] * 2 ** 20))
+        recorder = clip_recorder(ring, width=app.config['CLIP_WIDTH'],
+                                 metrics=camera_metrics(metrics, label))
+    return camera_worker(cam_id, open_capture, pipeline, frame_skip=app.config['FRAME_SKIP_MIN'],
+                         max_skip=app.config['FRAME_SKIP_MAX'], tiers=app.config['STREAM_TIERS'],
+                         metrics=camera_metrics(metrics, label), recorder=recorder)
+
+camera_workers = worker_registry(make_camera_worker)
+
+# ✅ Values read from the running components when /metrics is scraped
+metrics.register_callback("stream_viewers", "Clients currently watching a camera.",
+                          lambda: [({"camera": worker.metrics.camera}, worker.viewers)
+                                   for _, worker in camera_workers.running()])
+metrics.register_callback("camera_skip", "Process every n-th captured frame, as adapted to latency.",
+                          lambda: [({"camera": worker.metrics.camera}, worker.scheduler.skip)
+                                   for _, worker in camera_workers.running()])
+metrics.register_callback("alert_queue_total", "Alerts handled by the alert writer, by outcome.",
+                          lambda: [({"state": state}, value) for state, value in alert_queue.stats().items()
+                                   if state != "pending"],
+                          kind="counter")
+metrics.register_callback("alert_queue_depth", "Alerts waiting to be written.",
+                          lambda: [({}, alert_queue.stats()["pending"])])
+metrics.register_callback("alert_sounds_total", "Alert sounds by outcome (played, rate_limited, duplicate, ...).",
+                          lambda: [({"outcome": outcome}, value) for outcome, value in alert_sounds.counts.items()],
+                          kind="counter")
+metrics.register_callback("alert_clips_total", "Alert clips by outcome (written, dropped, failed).",
+                          lambda: [({"outcome": outcome}, value) for outcome, value in clips.counts.items()],
+                          kind="counter")
+metrics.register_callback("clip_pending_bytes", "Pre-roll memory held by clips waiting for their post-roll.",
+                          lambda: [({}, clips.pending_bytes)])
+metrics.register_callback("clip_buffer_bytes", "Memory held by a camera's clip buffer.",
+                          lambda: [({"camera": worker.metrics.camera}, worker.recorder.ring.bytes)
+                                   for _, worker in camera_workers.running() if worker.recorder is not None])
+metrics.register_callback("model_ready", "1 once a model has loaded.",
+                          lambda: [({"model": name}, int(status["state"] == "ready"))
+                                   for name, status in detector_models.status().items()])
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,88 @@
+"""
+Per-frame cost of the compiled detector plan for every combination of
+camera flags.
+
+    python benchmarks/bench_detector_plan.py --frames 50
+    python benchmarks/bench_detector_plan.py --video sample.mp4
+    python benchmarks/bench_detector_plan.py --imgsz 320
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from models.detector_plan import detector_plan
+from models.fire_detection import fire_detection
+from models.gear_detection import gear_detection
+from models.pose import detect_l_pose
+from models.restricted_zone import restricted_zone_detection
+
+FLAGS = ("restricted_zone", "fire_detection", "safety_gear_detection", "pose_alert")
+
+
+def load_frames(video, count):
+    if video is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 255, (580, 1000, 3), dtype=np.uint8) for _ in range(count)]
+
+    frames = []
+    cap = cv2.VideoCapture(video)
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (1000, 580)))
+    cap.release()
+    return frames
+
+
+def bench(plan, frames, warmup=3):
+    for frame in frames[:warmup]:
+        plan.run(frame.copy())
+
+    timings = []
+    for frame in frames:
+        frame = frame.copy()
+        start = time.perf_counter()
+        plan.run(frame)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=30, help="frames per flag combination")
+    parser.add_argument("--video", help="replay this video instead of synthetic frames")
+    parser.add_argument("--imgsz", type=int, default=640, help="model input size of every detector")
+    args = parser.parse_args()
+
+    detectors = {
+        "restricted_zone": restricted_zone_detection(conf=0.6, imgsz=args.imgsz),
+        "fire": fire_detection("models/fire.pt", conf=0.60, imgsz=args.imgsz),
+        "gear": gear_detection("models/gear.pt", imgsz=args.imgsz),
+        "pose": detect_l_pose,
+    }
+    # alerts are not under test, keep the benchmark quiet
+    for name in ("restricted_zone", "fire", "gear"):
+        detectors[name].play_alert_sound = lambda: None
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{'zone':>5} {'fire':>5} {'gear':>5} {'pose':>5} {'mean ms':>9} {'p95 ms':>9}")
+    for combo in itertools.product((False, True), repeat=len(FLAGS)):
+        camera = SimpleNamespace(**dict(zip(FLAGS, combo)))
+        timings = bench(detector_plan.from_camera(camera, detectors), frames)
+        marks = " ".join(f"{'x' if flag else '-':>5}" for flag in combo)
+        print(f"{marks} {timings.mean():9.2f} {np.percentile(timings, 95):9.2f}")
+
+
+if __name__ == "__main__":
+    main()
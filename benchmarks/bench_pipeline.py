@@ -0,0 +1,303 @@
+"""
+Replay recorded video (or synthetic frames) through the camera pipeline
+with any combination of detectors, and report fps, p50/p95/p99 latency of
+every stage, CPU and memory use. Runs offline on CPU: weights are never
+downloaded, so models/fire.pt, models/gear.pt and yolov8n.pt must exist.
+
+    python benchmarks/bench_pipeline.py --frames 100
+    python benchmarks/bench_pipeline.py --video fixtures/ --combos zone,fire+gear,all
+    python benchmarks/bench_pipeline.py --json before.json
+    python benchmarks/bench_pipeline.py --json after.json --compare before.json
+
+A combo is detectors joined by "+" (zone, fire, gear, pose) or "all".
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("YOLO_OFFLINE", "1")
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from models.detector_plan import detector_plan
+from models.fire_detection import fire_detection
+from models.gear_detection import gear_detection
+from models.pose import detect_l_pose, pose_smoother
+from models.restricted_zone import restricted_zone_detection
+
+CAMERA_FLAGS = {"zone": "restricted_zone", "fire": "fire_detection",
+                "gear": "safety_gear_detection", "pose": "pose_alert"}
+WEIGHTS = {"zone": "yolov8n.pt", "fire": "models/fire.pt", "gear": "models/gear.pt"}
+PERCENTILES = (50, 95, 99)
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+
+
+class stage_timer:
+    """collects per-stage latencies (ms) of the frame being processed"""
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds * 1000)
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+
+class timed_detector:
+    """
+    wraps a detector so the plan's calls into it are timed. without a
+    batching engine submit() runs inference synchronously, so its time is
+    the model's.
+    """
+    def __init__(self, detector, name, timer):
+        self._detector = detector
+        self._name = name
+        self._timer = timer
+
+    def __getattr__(self, attr):
+        return getattr(self._detector, attr)
+
+    def submit(self, img):
+        return self._timer.time(f"infer:{self._name}", self._detector.submit, img)
+
+    def postprocess(self, img, result, **kwargs):
+        return self._timer.time(f"post:{self._name}", self._detector.postprocess, img, result, **kwargs)
+
+    def draw_zone_overlay(self, img, zones=None):
+        return self._timer.time("overlay", self._detector.draw_zone_overlay, img, zones)
+
+
+def video_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(p for p in glob.glob(os.path.join(path, "*")) if p.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            files.append(path)
+    return files
+
+
+def synthetic_frames(count, size=(640, 480)):
+    """a textured background with a few moving blocks, so motion and edges look like a scene"""
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    for index in range(count):
+        frame = background.copy()
+        for block in range(3):
+            x = (index * (4 + block * 3) + block * 150) % (width - 80)
+            cv2.rectangle(frame, (x, 100 + block * 110), (x + 60, 200 + block * 90), (40 + 70 * block, 90, 200), -1)
+        yield frame
+
+
+def recorded_frames(files, count):
+    """decode frames from the video files in turn, looping until count frames were read"""
+    read = 0
+    while read < count:
+        progress = False
+        for path in files:
+            cap = cv2.VideoCapture(path)
+            while read < count:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                progress = True
+                read += 1
+                yield frame
+            cap.release()
+        if not progress:
+            raise SystemExit(f"No frames could be decoded from {', '.join(files)}")
+
+
+def build_detectors(names, timer, imgsz):
+    detectors = {"restricted_zone": None, "fire": None, "gear": None, "pose": None}
+    if "zone" in names or "pose" in names:
+        detectors["restricted_zone"] = restricted_zone_detection(WEIGHTS["zone"], conf=0.6, imgsz=imgsz)
+    if "fire" in names:
+        detectors["fire"] = fire_detection(WEIGHTS["fire"], conf=0.60, imgsz=imgsz)
+    if "gear" in names:
+        detectors["gear"] = gear_detection(WEIGHTS["gear"], imgsz=imgsz)
+    for key, name in (("restricted_zone", "zone"), ("fire", "fire"), ("gear", "gear")):
+        if detectors[key] is not None:
+            # alerts are not under test, keep the benchmark quiet
+            detectors[key].play_alert_sound = lambda: None
+            detectors[key] = timed_detector(detectors[key], name, timer)
+    if "pose" in names:
+        smoothing = pose_smoother()
+        detectors["pose"] = lambda frame, **kwargs: timer.time("pose", detect_l_pose, frame,
+                                                                smoothing=smoothing, **kwargs)
+    return detectors
+
+
+def check_weights(combos):
+    needed = {WEIGHTS[name] for combo in combos for name in combo if name in WEIGHTS}
+    if "pose" in {name for combo in combos for name in combo}:
+        needed.add(WEIGHTS["zone"])  # pose crops come from the person detector
+    missing = sorted(path for path in needed if not os.path.exists(path))
+    if missing:
+        raise SystemExit(f"Missing weights: {', '.join(missing)} (the benchmark never downloads models)")
+
+
+def parse_combos(text):
+    combos = []
+    for combo in text.split(","):
+        names = list(CAMERA_FLAGS) if combo == "all" else [name for name in combo.split("+") if name]
+        unknown = set(names) - set(CAMERA_FLAGS)
+        if unknown:
+            raise SystemExit(f"Unknown detector(s) {', '.join(sorted(unknown))}; use {', '.join(CAMERA_FLAGS)} or all")
+        combos.append(names)
+    return combos
+
+
+def summarize(samples):
+    values = np.array(samples)
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(values.mean()), 3)
+    return summary
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def run_combo(names, warmup_frames, frames, args):
+    timer = stage_timer()
+    detectors = build_detectors(names, timer, args.imgsz)
+    camera = SimpleNamespace(**{flag: name in names for name, flag in CAMERA_FLAGS.items()},
+                             motion_gate=args.motion_gate, user_id=0, cam_id="bench")
+    tracking = {"restricted_zone_breach": args.track, "gear_detection": args.track} if args.track else None
+    plan = detector_plan.from_camera(camera, detectors, tracking=tracking)
+    display_size = tuple(args.display) if args.display else None
+
+    def process(frame):
+        display = timer.time("resize", cv2.resize, frame, display_size) if display_size else frame.copy()
+        display = timer.time("plan", plan.run, display, source=frame) if plan else display
+        timer.time("encode", cv2.imencode, ".jpg", display, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
+
+    # the first frames load weights and warm up caches
+    for frame in warmup_frames:
+        process(frame)
+    timer.samples.clear()
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for frame in frames:
+        timer.time("total", process, frame)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    return {
+        "detectors": names,
+        "frames": len(frames),
+        "fps": round(len(frames) / wall, 2),
+        "cpu_percent": round(100 * cpu / wall, 1),
+        "rss_mb": round(current_rss_mb(), 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {stage: summarize(samples) for stage, samples in sorted(timer.samples.items())},
+    }
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                                  text=True, cwd=ROOT).stdout.strip()
+    except OSError:
+        revision = ""
+    return {"revision": revision, "python": platform.python_version(), "opencv": cv2.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count(), "torch_threads": torch_threads()}
+
+
+def torch_threads():
+    try:
+        import torch
+        return torch.get_num_threads()
+    except ImportError:
+        return None
+
+
+def print_run(run):
+    # "plan" contains the infer/post/overlay/pose stages, "total" everything
+    print(f"\n{'+'.join(run['detectors']) or 'none'}: {run['fps']} fps, {run['cpu_percent']}% CPU, "
+          f"{run['rss_mb']} MB RSS (peak {run['peak_rss_mb']} MB)")
+    print(f"  {'stage':<16}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+    for stage, summary in run["stages"].items():
+        print(f"  {stage:<16}" + "".join(f"{summary[f'p{p}']:>10.2f}" for p in PERCENTILES))
+
+
+def compare(runs, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {tuple(run["detectors"]): run for run in json.load(f)["runs"]}
+    print(f"\nChange against {baseline_path} (negative latency is faster):")
+    for run in runs:
+        old = baseline.get(tuple(run["detectors"]))
+        if old is None:
+            continue
+        fps = 100 * (run["fps"] - old["fps"]) / old["fps"]
+        p95 = run["stages"]["total"]["p95"] - old["stages"]["total"]["p95"]
+        print(f"  {'+'.join(run['detectors']) or 'none':<20} fps {fps:+6.1f}%   total p95 {p95:+8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", nargs="*", default=[], help="video files or folders of them to replay")
+    parser.add_argument("--frames", type=int, default=100, help="frames per combo")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured frames run first")
+    parser.add_argument("--combos", default="zone,fire,gear,pose,all", help="comma separated detector combos")
+    parser.add_argument("--imgsz", type=int, default=640, help="model input size of every detector")
+    parser.add_argument("--display", type=int, nargs=2, default=[1000, 580], metavar=("W", "H"),
+                        help="display size frames are resized to")
+    parser.add_argument("--motion-gate", action="store_true", help="skip detection on static frames")
+    parser.add_argument("--track", type=int, default=0, metavar="N",
+                        help="detect-then-track the zone and gear detectors with a keyframe every N frames")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="print the change against an earlier --json file")
+    args = parser.parse_args()
+
+    combos = parse_combos(args.combos)
+    check_weights(combos)
+    # decode once up front so decoding is reported on its own and every
+    # combo sees the same frames
+    count = args.frames + args.warmup
+    source = recorded_frames(video_files(args.video), count) if args.video else synthetic_frames(count)
+    frames, decode = [], []
+    start = time.perf_counter()
+    for frame in source:
+        decode.append((time.perf_counter() - start) * 1000)
+        frames.append(frame)
+        start = time.perf_counter()
+    warmup_frames, frames = frames[:args.warmup], frames[args.warmup:]
+
+    results = {"environment": environment(), "args": vars(args),
+               "decode": summarize(decode), "runs": []}
+    print(f"decode: p50 {results['decode']['p50']:.2f} ms, {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    for names in combos:
+        run = run_combo(names, warmup_frames, frames, args)
+        results["runs"].append(run)
+        print_run(run)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+    if args.compare:
+        compare(results["runs"], args.compare)
+
+
+if __name__ == "__main__":
+    main()
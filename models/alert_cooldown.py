@@ -0,0 +1,42 @@
+import threading
+from datetime import datetime, timedelta
+
+
+class alert_cooldown:
+    """
+    this class remembers when each (user, camera, alert type) last raised an
+    alert, so the cooldown check never has to query the alerts database.
+
+    Args:
+    window: minimum time between two alerts with the same key.
+    """
+    def __init__(self, window=timedelta(minutes=1)):
+        self.window = window
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def seed(self, rows):
+        """load [(key, last_alert_time)], e.g. from the database at startup"""
+        with self._lock:
+            for key, last in rows:
+                if last is not None and (key not in self._last or last > self._last[key]):
+                    self._last[key] = last
+
+    def claim(self, key, now=None):
+        """
+        return True and start a new cooldown if key may alert at `now`,
+        False while the previous alert for key is still cooling down.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last <= self.window:
+                return False
+            self._last[key] = now
+            return True
+
+    def release(self, key, now):
+        """undo a claim whose alert could not be stored"""
+        with self._lock:
+            if self._last.get(key) == now:
+                del self._last[key]
@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+
+
+class alert_writer:
+    """
+    this class takes alerts off the streaming path: add_to_db only queues
+    them, and a background thread persists them in batches with a single
+    commit per batch.
+
+    Args:
+    persist: callable(list of alerts) storing a whole batch.
+    max_queue: alerts waiting beyond this are dropped instead of blocking.
+    max_batch: maximum number of alerts per commit.
+    flush_interval: seconds to wait for more alerts before committing.
+    on_failure: optional callable(alert) for alerts that were not stored.
+    """
+    def __init__(self, persist, max_queue=256, max_batch=32, flush_interval=0.5, on_failure=None):
+        self.persist = persist
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.on_failure = on_failure
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._counters = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="alert-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+    def submit(self, alert):
+        """queue an alert; returns False (and counts a drop) when the queue is full"""
+        if self._closed.is_set():
+            return False
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("queued")
+        return True
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.persist(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} alerts: {e}")
+            self._count("failed", len(batch))
+            if self.on_failure is not None:
+                for alert in batch:
+                    self.on_failure(alert)
+        else:
+            self._count("written", len(batch))
+            self._count("batches")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """block until every queued alert has been written or failed"""
+        self._queue.join()
+
+    def close(self, timeout=5.0):
+        """stop accepting alerts and give the writer time to drain the queue"""
+        self._closed.set()
+        self._thread.join(timeout)
@@ -0,0 +1,116 @@
+import json
+import queue
+import threading
+import time
+import urllib.request
+
+
+class local_sound_sink:
+    """plays the alert's sound file on this machine, one sound at a time"""
+    def __init__(self):
+        self._playsound = None
+
+    def __call__(self, alert):
+        if self._playsound is None:
+            # playsound is only needed on machines that actually play audio
+            from playsound import playsound
+            self._playsound = playsound
+        self._playsound(alert["sound_path"])
+
+
+class webhook_sink:
+    """
+    posts each alert as JSON to url, for a siren controller or paging
+    service to act on instead of a local speaker.
+
+    Args:
+    url: endpoint receiving {"alert_type", "camera", "sound_path", "time"}.
+    timeout: seconds to wait for the endpoint before giving up.
+    """
+    def __init__(self, url, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, alert):
+        request = urllib.request.Request(self.url, data=json.dumps(alert).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class null_sink:
+    """discards alerts, for headless servers without a speaker"""
+    def __call__(self, alert):
+        pass
+
+
+class audio_dispatcher:
+    """
+    this class plays alert sounds for every detector from a single thread.
+    an alert type that is already waiting in the queue is not queued again,
+    and each type sounds at most once per min_interval seconds, so a
+    detection that lasts minutes sounds a handful of times instead of on
+    every frame.
+
+    Args:
+    sink: callable receiving an alert dict; local_sound_sink, webhook_sink
+          or null_sink.
+    min_interval: minimum seconds between two sounds of the same alert type.
+    max_queue: alerts waiting beyond this are dropped.
+    """
+    def __init__(self, sink=None, min_interval=5.0, max_queue=16):
+        self.sink = sink if sink is not None else local_sound_sink()
+        self.min_interval = min_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()
+        self._last_played = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counts = {"played": 0, "rate_limited": 0, "duplicate": 0, "queue_full": 0, "failed": 0}
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def play(self, alert_type, sound_path, camera=None):
+        """queue a sound for alert_type unless it is rate limited; never blocks"""
+        now = time.monotonic()
+        with self._lock:
+            if alert_type in self._pending:
+                self.counts["duplicate"] += 1
+                return False
+            last = self._last_played.get(alert_type)
+            if last is not None and now - last < self.min_interval:
+                self.counts["rate_limited"] += 1
+                return False
+            self._pending.add(alert_type)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audio-dispatcher", daemon=True)
+                self._thread.start()
+        alert = {"alert_type": alert_type, "camera": camera, "sound_path": sound_path, "time": time.time()}
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(alert_type)
+                self.counts["queue_full"] += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            with self._lock:
+                self._pending.discard(alert["alert_type"])
+                # the interval runs from when the sound starts, not when it was queued
+                self._last_played[alert["alert_type"]] = time.monotonic()
+            try:
+                self.sink(alert)
+                self._count("played")
+            except Exception as e:
+                self._count("failed")
+                print(f"Error playing {alert['alert_type']} alert sound: {e}")
+
+
+# shared by every detector, so the whole process has one audio thread
+alert_sounds = audio_dispatcher()
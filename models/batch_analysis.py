@@ -0,0 +1,312 @@
+import csv
+import glob
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from models.model_export import input_stride, supports_batching
+from models.preprocess import model_input
+from models.process_backend import detections, remote_result
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+# command line names of the detectors -> alert names
+ANALYSIS_DETECTORS = {"zone": "restricted_zone_breach", "fire": "fire_detection",
+                      "gear": "gear_detection", "pose": "pose_alert"}
+DETECTION_COLUMNS = ("video", "frame", "seconds", "alert_type", "x1", "y1", "x2", "y2", "conf", "cls")
+
+_DONE = object()
+
+
+def video_files(paths):
+    """the videos among paths, expanding folders (recursively) into the videos they contain"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(p for p in glob.glob(os.path.join(path, "**", "*"), recursive=True)
+                                if p.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            files.append(path)
+    return files
+
+
+class decoded_frame:
+    """one sampled frame of a video with its letterboxed model inputs"""
+    def __init__(self, video, index, seconds, frame, sizes):
+        self.video = video
+        self.index = index
+        self.seconds = seconds
+        self.frame = frame
+        self.inputs = {size: model_input(frame, size, stride=stride) for size, stride in sizes.items()}
+
+
+class frame_reader:
+    """
+    this class decodes several videos at once, each on its own thread, and
+    letterboxes the sampled frames for the models on the same threads, so
+    inference never waits for decoding. frames come out of one bounded
+    queue, in order within a video.
+
+    Args:
+    files: video paths.
+    sizes: dict of model input size -> stride (see model_input) every
+           sampled frame is letterboxed to.
+    stride: analyse every stride-th frame; the others are grabbed without decoding.
+    threads: number of videos decoded at once.
+    max_queued: decoded frames held before the decoders wait.
+    """
+    def __init__(self, files, sizes, stride=1, threads=None, max_queued=64):
+        self.sizes = dict(sizes)
+        self.stride = max(1, stride)
+        self.threads = max(1, min(threads or os.cpu_count() or 1, len(files) or 1))
+        self.frames_read = 0
+        self.failed = []
+        self._files = queue.Queue()
+        for path in files:
+            self._files.put(path)
+        self._frames = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+
+    def _decode(self):
+        try:
+            while True:
+                try:
+                    path = self._files.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self._decode_file(path)
+                except Exception as e:
+                    print(f"Error decoding {path}: {e}")
+                    self.failed.append(path)
+        finally:
+            self._frames.put(_DONE)
+
+    def _decode_file(self, path):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError("cannot open video")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        index = 0
+        try:
+            while cap.grab():
+                if index % self.stride == 0:
+                    ok, frame = cap.retrieve()
+                    if ok:
+                        self._frames.put(decoded_frame(path, index, index / fps, frame, self.sizes))
+                index += 1
+        finally:
+            cap.release()
+            with self._lock:
+                self.frames_read += index
+
+    def __iter__(self):
+        for index in range(self.threads):
+            threading.Thread(target=self._decode, name=f"decode-{index}", daemon=True).start()
+        running = self.threads
+        while running:
+            item = self._frames.get()
+            if item is _DONE:
+                running -= 1
+            else:
+                yield item
+
+
+class detection_file:
+    """
+    collects the detections of an analysis run column by column and writes
+    them on close(): Parquet for a .parquet path (needs pyarrow), CSV otherwise.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.columns = {name: [] for name in DETECTION_COLUMNS}
+        if path.endswith(".parquet"):
+            import pyarrow  # fail before the run, not after it
+
+    def add(self, video, index, seconds, alert_type, rows):
+        for row in rows:
+            values = (video, index, seconds, alert_type, *map(float, row[:5]), int(row[5]))
+            for name, value in zip(DETECTION_COLUMNS, values):
+                self.columns[name].append(value)
+
+    def close(self):
+        if self.path.endswith(".parquet"):
+            import pyarrow
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(pyarrow.table(self.columns), self.path)
+            return
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(DETECTION_COLUMNS)
+            writer.writerows(zip(*self.columns.values()))
+
+
+def predict(detector, images):
+    """run detector's model over images, one frame per call for models that cannot batch"""
+    step = max(1, len(images)) if supports_batching(detector.model_path) else 1
+    predictions = []
+    for start in range(0, len(images), step):
+        predictions.extend(detector.model(images[start:start + step], verbose=False, imgsz=detector.imgsz))
+    return predictions
+
+
+def kept_rows(data, boxes):
+    """the rows of data (N x 6) whose integer boxes postprocess kept"""
+    rows = {tuple(map(int, row[:4])): row for row in data}
+    return [rows[tuple(box)] for box in boxes if tuple(box) in rows]
+
+
+def analyze_videos(files, stages, pose=None, persons=None, batch_size=16, stride=1, threads=None,
+                   zones=None, on_detection=None):
+    """
+    run detectors over recorded videos as fast as the machine allows: frames
+    are decoded and letterboxed on several threads while each model runs on
+    batches of batch_size frames. nothing is encoded for display.
+
+    Args:
+    files: video paths.
+    stages: list of (alert_name, detector) for the YOLO detectors to run.
+    pose: callable like detect_l_pose for L-pose alerts, or None.
+    persons: the restricted zone detector, supplying the pose crops.
+    zones: zone_set applied to restricted zone breaches, or None.
+    on_detection: callable(frame, alert_type, boxes, rows) per positive
+                  detector and frame, with frame a decoded_frame annotated
+                  in place and rows the (x1, y1, x2, y2, conf, class) kept.
+
+    Returns:
+    dict with frame counts, timings and throughput of the run.
+    """
+    if pose is not None and persons is not None and not any(detector is persons for _, detector in stages):
+        stages = stages + [("persons", persons)]
+    reader = frame_reader(files, {detector.imgsz: input_stride(detector.model_path) for _, detector in stages},
+                          stride=stride, threads=threads)
+    timings = {}
+    counts = {"frames_analyzed": 0, "positives": 0}
+
+    def timed(stage, start):
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def run_batch(batch):
+        results = [{} for _ in batch]
+        for alert_name, detector in stages:
+            start = time.perf_counter()
+            images = [item.inputs[detector.imgsz].image for item in batch]
+            predictions = predict(detector, images)
+            timed(f"infer:{alert_name}", start)
+            for item, prediction, by_name in zip(batch, predictions, results):
+                by_name[alert_name] = item.inputs[detector.imgsz].to_display(detections(prediction), item.frame.shape)
+
+        start = time.perf_counter()
+        for item, by_name in zip(batch, results):
+            person_boxes = None
+            for alert_name, detector in stages:
+                result = remote_result(by_name[alert_name])
+                if detector is persons:
+                    person_boxes = persons.persons(result)
+                if alert_name == "persons":
+                    continue
+                if alert_name == "restricted_zone_breach":
+                    found, boxes = detector.postprocess(item.frame, result, zones=zones)
+                else:
+                    found, boxes = detector.postprocess(item.frame, result)
+                if found:
+                    counts["positives"] += 1
+                    if on_detection is not None:
+                        on_detection(item, alert_name, boxes, kept_rows(by_name[alert_name], boxes))
+            if pose is not None:
+                _, detected = pose(item.frame, key=item.video, person_boxes=person_boxes)
+                if detected:
+                    counts["positives"] += 1
+                    if on_detection is not None:
+                        on_detection(item, "pose_alert", [], [])
+        timed("postprocess", start)
+        counts["frames_analyzed"] += len(batch)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    batch = []
+    waited = time.perf_counter()
+    for item in reader:
+        batch.append(item)
+        if len(batch) == batch_size:
+            timed("decode_wait", waited)
+            run_batch(batch)
+            batch = []
+            waited = time.perf_counter()
+    if batch:
+        timed("decode_wait", waited)
+        run_batch(batch)
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "videos": len(files) - len(reader.failed),
+        "failed": reader.failed,
+        "frames_read": reader.frames_read,
+        **counts,
+        "seconds": wall,
+        "fps": counts["frames_analyzed"] / wall if wall else 0.0,
+        "cpu_percent": 100 * (time.process_time() - cpu_start) / wall / (os.cpu_count() or 1) if wall else 0.0,
+        "stages": timings,
+    }
+
+
+def measure_prefilter(files, detector, make_filter, stride=1, batch_size=16, threads=None):
+    """
+    measure a prefilter against the fire model on recorded footage: the
+    model runs on every sampled frame, and its positives are compared with
+    the frames the prefilter would have let through.
+
+    Args:
+    files: video paths.
+    detector: fire_detection whose model and postprocess define a positive.
+    make_filter: callable() returning a fresh fire_prefilter per video.
+
+    Returns:
+    dict with frame and positive counts, "filter_recall" (positives passed
+    by the colour/flicker test alone), "recall" (positives the model would
+    have run on, counting the periodic checks and hold) and "run_rate"
+    (share of frames the model would still run on), and the videos that
+    could not be read.
+    """
+    reader = frame_reader(files, {detector.imgsz: input_stride(detector.model_path)}, stride=stride, threads=threads)
+    filters = {}
+    counts = {"frames": 0, "positives": 0, "passed": 0, "run": 0, "positives_passed": 0, "positives_run": 0}
+
+    def run_batch(batch):
+        images = [item.inputs[detector.imgsz].image for item in batch]
+        for item, prediction in zip(batch, predict(detector, images)):
+            prefilter = filters.get(item.video)
+            if prefilter is None:
+                prefilter = filters[item.video] = make_filter()
+            # timed by the footage instead of the clock
+            run = prefilter.check(item.frame, now=item.seconds)
+            passed = prefilter.passed
+
+            data = item.inputs[detector.imgsz].to_display(detections(prediction), item.frame.shape)
+            positive = any(row[4] > detector.confidence for row in data)
+            counts["frames"] += 1
+            counts["passed"] += passed
+            counts["run"] += run
+            if positive:
+                counts["positives"] += 1
+                counts["positives_passed"] += passed
+                counts["positives_run"] += run
+
+    batch = []
+    for item in reader:
+        batch.append(item)
+        if len(batch) == batch_size:
+            run_batch(batch)
+            batch = []
+    if batch:
+        run_batch(batch)
+
+    positives = counts["positives"]
+    return {
+        **counts,
+        "failed": reader.failed,
+        "filter_recall": counts["positives_passed"] / positives if positives else 1.0,
+        "recall": counts["positives_run"] / positives if positives else 1.0,
+        "run_rate": counts["run"] / counts["frames"] if counts["frames"] else 0.0,
+    }
@@ -0,0 +1,279 @@
+import threading
+import time
+from functools import partial
+
+import cv2
+
+from models.frame_grabber import frame_grabber
+from models.frame_scheduler import frame_scheduler
+from models.metrics import no_metrics
+
+# what a viewer can ask for: the full display frame, or a small, slower
+# stream for grids of many cameras. width None keeps the processed size.
+STREAM_TIERS = {
+    "full": {"width": None, "quality": 75, "max_fps": None},
+    "thumb": {"width": 320, "quality": 60, "max_fps": 5},
+}
+
+
+class camera_worker:
+    """
+    this class owns a single camera capture and runs the detection pipeline
+    once per frame in a background thread. every viewer of the feed reads
+    the same latest annotated frame instead of opening its own capture; it
+    is JPEG encoded at most once per frame and stream tier, and only for
+    tiers somebody is watching.
+
+    Args:
+    camid: camera id as stored in Camera.cam_id.
+    open_capture: callable(camid) returning an opened cv2.VideoCapture.
+    process_frame: callable(frame) returning the annotated frame.
+    frame_skip: process at most every frame_skip-th frame; more frames are
+                dropped automatically when processing falls behind.
+    max_skip: upper bound on the adaptive skip.
+    idle_timeout: seconds the worker keeps running with no viewers.
+    tiers: dict of tier name -> {"width", "quality", "max_fps"}, see
+           STREAM_TIERS.
+    metrics: camera_metrics receiving stage timings and frame counts, or None.
+    recorder: clip_recorder buffering the processed frames for alert clips, or None.
+    """
+    def __init__(self, camid, open_capture, process_frame, frame_skip=2, max_skip=30,
+                 idle_timeout=10.0, tiers=None, metrics=None, recorder=None):
+        self.camid = camid
+        self.open_capture = open_capture
+        self.process_frame = process_frame
+        self.frame_skip = frame_skip
+        self.max_skip = max_skip
+        self.scheduler = None
+        self.idle_timeout = idle_timeout
+        self.tiers = tiers or STREAM_TIERS
+        self.metrics = metrics or no_metrics()
+        self.recorder = recorder
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._grabber = None
+        self._stop = threading.Event()
+        self._frame = None
+        self._seq = 0
+        self._encoded = {}   # tier -> (seq, jpeg bytes)
+        self._encode_locks = {tier: threading.Lock() for tier in self.tiers}
+        self._subscribers = 0
+        self._idle_since = time.monotonic()
+
+    @property
+    def viewers(self):
+        with self._cond:
+            return self._subscribers
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        open the capture in the calling thread, so a bad camera id fails the
+        request that asked for it, then start the worker thread.
+        """
+        self._grabber = frame_grabber(partial(self.open_capture, self.camid), metrics=self.metrics)
+        self._grabber.start()
+        # only a camera that opened gets a recording thread
+        if self.recorder is not None:
+            self.recorder.start()
+        self.scheduler = frame_scheduler(source_fps=self._grabber.fps,
+                                         min_skip=self.frame_skip, max_skip=self.max_skip)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.camid}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def reconfigure(self, process_frame):
+        """swap the pipeline used for the next frames, e.g. after camera flags change"""
+        self.process_frame = process_frame
+
+    def _publish(self, frame):
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify_all()
+
+    def _jpeg(self, tier):
+        """the latest frame encoded for tier, encoding it if no viewer of the tier has yet"""
+        with self._encode_locks[tier]:
+            with self._cond:
+                seq, frame = self._seq, self._frame
+            cached = self._encoded.get(tier)
+            if cached is not None and cached[0] == seq:
+                return cached[1]
+
+            start = time.perf_counter()
+            settings = self.tiers[tier]
+            width = settings["width"]
+            if width and width < frame.shape[1]:
+                frame = cv2.resize(frame, (width, round(frame.shape[0] * width / frame.shape[1])),
+                                   interpolation=cv2.INTER_AREA)
+            _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), settings["quality"]])
+            data = buffer.tobytes()
+            self.metrics.stage(f"encode:{tier}", time.perf_counter() - start)
+            self._encoded[tier] = (seq, data)
+            return data
+
+    def _is_idle(self):
+        with self._cond:
+            if self._subscribers:
+                return False
+            return time.monotonic() - self._idle_since > self.idle_timeout
+
+    def _run(self):
+        seq = 0
+        try:
+            while not self._stop.is_set() and not self._grabber.stopped:
+                # the grabber keeps only the freshest frame, so waiting for
+                # `skip` new frames never processes a stale one
+                new_seq, frame = self._grabber.read(after=seq + self.scheduler.frames_to_drop())
+                if frame is None:
+                    # no new frame yet, e.g. while the stream reconnects
+                    if self._is_idle():
+                        break
+                    continue
+                if new_seq - seq > 1:
+                    # frames the grabber replaced before anyone processed them
+                    self.metrics.count("frames_dropped", new_seq - seq - 1)
+                seq = new_seq
+
+                start = time.monotonic()
+                try:
+                    frame = self.process_frame(frame)
+                except Exception as e:
+                    print(f"Error processing frame for camera {self.camid}: {e}")
+                    self.metrics.count("frame_errors")
+                    continue
+                self.metrics.stage("process", time.monotonic() - start)
+                self.metrics.count("frames_processed")
+
+                self._publish(frame)
+                if self.recorder is not None:
+                    self.recorder.add(frame)
+                self.scheduler.record(time.monotonic() - start)
+
+                if self._is_idle():
+                    break
+        finally:
+            self._grabber.stop()
+            if self.recorder is not None:
+                self.recorder.close()
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+
+    def jpegs(self, tier="full", keepalive=5.0):
+        """
+        generator of JPEG frames for one viewer. the viewer paces delivery:
+        it only ever receives the newest frame once it is ready for one, so
+        a slow client skips frames rather than buffering them, and a tier's
+        max_fps caps the rate further. while the camera reconnects the last
+        frame is repeated every keepalive seconds, which also notices
+        closed viewers.
+        """
+        max_fps = self.tiers[tier]["max_fps"]
+        interval = 1.0 / max_fps if max_fps else 0.0
+        with self._cond:
+            self._subscribers += 1
+        last_seq = 0
+        next_send = 0.0
+        try:
+            while True:
+                wait = next_send - time.monotonic()
+                if wait > 0 and self._stop.wait(wait):
+                    return
+                with self._cond:
+                    fresh = self._cond.wait_for(lambda: self._seq != last_seq or self._stop.is_set(),
+                                                timeout=keepalive)
+                    if self._stop.is_set() and self._seq == last_seq:
+                        return
+                    if not fresh and self._frame is None:
+                        continue
+                    last_seq = self._seq
+                data = self._jpeg(tier)
+                next_send = time.monotonic() + interval
+                # the generator resumes once the server has sent the frame
+                start = time.perf_counter()
+                yield data
+                self.metrics.stage("send", time.perf_counter() - start)
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+                if not self._subscribers:
+                    self._idle_since = time.monotonic()
+
+    def frames(self, tier="full", keepalive=5.0):
+        """generator of multipart MJPEG chunks for one viewer, see jpegs()"""
+        jpegs = self.jpegs(tier, keepalive)
+        try:
+            for data in jpegs:
+                yield b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' + data + b'\r\n'
+        finally:
+            jpegs.close()
+
+
+class worker_registry:
+    """
+    keeps one camera_worker per key, starting it on first use and replacing
+    it once it has stopped (idle timeout or lost stream). a worker is built
+    and started under its key's own lock, so a slow camera only holds up
+    viewers of that camera.
+
+    Args:
+    factory: callable(key) returning a new, not yet started camera_worker.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self._workers = {}
+        self._starting = {}  # key -> lock held while that key's worker starts
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            worker = self._workers.get(key)
+            if worker is not None and worker.running:
+                return worker
+            starting = self._starting.setdefault(key, threading.Lock())
+        with starting:
+            # another viewer may have started it while we waited
+            worker = self.find(key)
+            if worker is None:
+                worker = self.factory(key)
+                worker.start()
+                with self._lock:
+                    self._workers[key] = worker
+            return worker
+
+    def find(self, key):
+        with self._lock:
+            worker = self._workers.get(key)
+        if worker is not None and worker.running:
+            return worker
+        return None
+
+    def running(self):
+        """(key, worker) for every running worker"""
+        with self._lock:
+            workers = list(self._workers.items())
+        return [(key, worker) for key, worker in workers if worker.running]
+
+    def discard(self, key):
+        with self._lock:
+            worker = self._workers.pop(key, None)
+        if worker is not None:
+            worker.stop()
+
+    def stop_all(self):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import cv2
+import numpy as np
+
+from models.metrics import no_metrics
+
+
+class frame_ring:
+    """
+    this class keeps the last `seconds` of a camera as JPEG frames, dropping
+    the oldest ones early if they would take more than max_bytes.
+
+    Args:
+    seconds: how much footage is kept.
+    max_bytes: upper bound on the memory held by the encoded frames.
+    """
+    def __init__(self, seconds=10.0, max_bytes=16 * 2 ** 20):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._frames = deque()  # (time, jpeg bytes)
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, data):
+        with self._lock:
+            self._frames.append((timestamp, data))
+            self.bytes += len(data)
+            while self._frames and (self.bytes > self.max_bytes or timestamp - self._frames[0][0] > self.seconds):
+                self.bytes -= len(self._frames.popleft()[1])
+
+    def since(self, start, end=None):
+        """frames with start <= time (< end), oldest first"""
+        with self._lock:
+            return [(t, data) for t, data in self._frames if t >= start and (end is None or t < end)]
+
+
+class clip_recorder:
+    """
+    this class gives one camera its ring of recent encoded frames. add() is
+    called with every processed frame and returns at once: a background
+    thread, started by start(), JPEG encodes the frame into the ring, and a
+    frame that arrives while the previous one is still being encoded
+    replaces it.
+
+    Args:
+    ring: frame_ring holding the footage; it should keep at least the
+          pre-roll plus the post-roll.
+    width: frames are downscaled to this width before encoding (None keeps them).
+    quality: JPEG quality of the buffered frames.
+    metrics: camera_metrics receiving the encoding time, or None.
+    """
+    def __init__(self, ring, width=640, quality=70, metrics=None):
+        self.ring = ring
+        self.width = width
+        self.quality = quality
+        self.metrics = metrics or no_metrics()
+        self._latest = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="clip-ring", daemon=True)
+        self._thread.start()
+
+    def add(self, frame, timestamp=None):
+        with self._cond:
+            if self._latest is not None:
+                self.metrics.count("clip_frames_dropped")
+            self._latest = (timestamp or time.time(), frame)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._latest is not None or self._closed)
+                if self._closed:
+                    return
+                timestamp, frame = self._latest
+                self._latest = None
+            start = time.perf_counter()
+            if self.width and frame.shape[1] > self.width:
+                frame = cv2.resize(frame, (self.width, round(frame.shape[0] * self.width / frame.shape[1])),
+                                   interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            if ok:
+                self.ring.add(timestamp, buffer.tobytes())
+            self.metrics.stage("encode:clip", time.perf_counter() - start)
+
+
+class clip_writer:
+    """
+    this class turns alerts into short video clips on a single background
+    thread shared by all cameras. request() snapshots the pre-roll at once,
+    and the clip is written when the post-roll has been recorded, so live
+    streams never wait for video encoding.
+
+    Args:
+    root: directory the clips are written to, as <key>.mp4.
+    pre_roll: seconds of footage before the alert.
+    post_roll: seconds of footage after the alert.
+    max_pending: clips waiting for their post-roll beyond this are dropped.
+    max_pending_bytes: the same for the pre-roll frames the waiting clips
+                       hold, which the camera rings may already have dropped.
+    """
+    def __init__(self, root, pre_roll=5.0, post_roll=5.0, max_pending=32, max_pending_bytes=64 * 2 ** 20):
+        self.root = root
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_pending = max_pending
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self.counts = {"written": 0, "dropped": 0, "failed": 0}
+        self._pending = []  # heap of (due time, order, key, ring, pre-roll frames, alert time, bytes)
+        self._scheduled = set()  # keys requested and not yet written or failed
+        self._cancelled = set()
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @staticmethod
+    def valid_key(key):
+        return bool(key) and len(key) == 32 and all(c in "0123456789abcdef" for c in key)
+
+    def path(self, key):
+        if not self.valid_key(key):
+            raise ValueError(f"Invalid clip key: {key!r}")
+        return os.path.join(self.root, f"{key}.mp4")
+
+    @staticmethod
+    def new_key():
+        return uuid.uuid4().hex
+
+    def request(self, ring, key=None, at=None):
+        """schedule a clip around time `at` (now) from ring; returns its key, or None if dropped"""
+        at = at or time.time()
+        key = key or self.new_key()
+        frames = ring.since(at - self.pre_roll, at)
+        size = sum(len(data) for _, data in frames)
+        with self._cond:
+            if len(self._pending) >= self.max_pending or self.pending_bytes + size > self.max_pending_bytes:
+                self.counts["dropped"] += 1
+                return None
+            self.pending_bytes += size
+            # a little slack for the last post-roll frame to be encoded
+            due = at + self.post_roll + 0.5
+            heapq.heappush(self._pending, (due, next(self._order), key, ring, frames, at, size))
+            self._scheduled.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return key
+
+    def cancel(self, key):
+        """drop a requested clip, e.g. when its alert could not be queued"""
+        with self._cond:
+            if key in self._scheduled:
+                self._cancelled.add(key)
+
+    def state(self, key):
+        """
+        "ready" once the clip is on disk, "pending" while it waits for its
+        post-roll or is being written, and "failed" for a clip that was
+        dropped, failed to write or was lost in a restart
+        """
+        if not self.valid_key(key):
+            return None
+        with self._cond:
+            if key in self._scheduled:
+                return "pending"
+        return "ready" if os.path.exists(self.path(key)) else "failed"
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending or self._pending[0][0] > time.time():
+                    self._cond.wait(timeout=self._pending[0][0] - time.time() if self._pending else None)
+                _, _, key, ring, frames, at, size = heapq.heappop(self._pending)
+                self.pending_bytes -= size
+                cancelled = key in self._cancelled
+                self._cancelled.discard(key)
+            try:
+                if not cancelled:
+                    self._write(key, frames + ring.since(at, at + self.post_roll))
+                    self.counts["written"] += 1
+            except Exception as e:
+                self.counts["failed"] += 1
+                print(f"Error writing alert clip {key}: {e}")
+            finally:
+                with self._cond:
+                    self._scheduled.discard(key)
+
+    def _write(self, key, frames):
+        if not frames:
+            raise ValueError("no frames buffered")
+        decode = lambda data: cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        duration = frames[-1][0] - frames[0][0]
+        fps = min(30.0, max(1.0, (len(frames) - 1) / duration)) if duration > 0 else 1.0
+        height, width = decode(frames[0][1]).shape[:2]
+
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(key)
+        tmp_path = os.path.join(self.root, f"{key}.tmp.mp4")
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        try:
+            if not writer.isOpened():
+                raise IOError("video writer could not be opened")
+            # decoded one at a time, so a clip never holds more than a frame of pixels
+            for _, data in frames:
+                image = decode(data)
+                if image.shape[:2] != (height, width):
+                    image = cv2.resize(image, (width, height))
+                writer.write(image)
+        finally:
+            writer.release()
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
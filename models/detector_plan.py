@@ -0,0 +1,270 @@
+import time
+
+import cv2
+
+from models.fire_prefilter import fire_prefilter
+from models.metrics import no_metrics
+from models.model_export import input_stride
+from models.motion_gate import motion_gate
+from models.preprocess import model_input
+from models.process_backend import local_backend, remote_result, detections
+from models.tracker import box_tracker
+from models.zones import parse_zones, zone_set
+
+
+class detector_plan:
+    """
+    this class holds only the detection stages a camera has enabled, compiled
+    once from its Camera row, so disabled detectors cost nothing per frame.
+
+    Args:
+    stages: list of (alert_name, detector, every) for the enabled YOLO
+            detectors; a stage runs on every `every`-th processed frame.
+    overlay: detector whose zone overlay is drawn on every frame, or None.
+    pose: callable(frame, key, person_boxes) -> (frame, detected) for
+          L-pose alerts, or None.
+    persons: detector whose persons(result) supplies the pose stage's crops
+             (the restricted zone detector); None runs pose on whole frames.
+    gate: motion_gate that skips detection on static frames, or None.
+    pose_every: the pose stage runs on every pose_every-th processed frame.
+    backend: where the models run (local_backend or process_backend).
+    key: camera identity passed to the backend, e.g. (user_id, cam_id).
+    metrics: camera_metrics receiving per-stage timings and counts, or None.
+    trackers: dict of alert name -> box_tracker for stages run in
+              detect-then-track mode: their model only runs every `every`
+              frames and the tracker carries the boxes in between. they
+              alert once per track instead of on every positive frame.
+    zones: the camera's zone_set for the restricted zone stage and overlay;
+           None treats the entire frame as restricted.
+    fire_filter: fire_prefilter deciding which frames the fire stage runs
+                 on, or None to run it on every due frame.
+    result_timeout: seconds a stage waits for its model before it fails
+                    for this frame.
+    """
+    def __init__(self, stages, overlay=None, pose=None, gate=None, pose_every=1, backend=None, key=None,
+                 persons=None, metrics=None, trackers=None, zones=None, fire_filter=None, result_timeout=30.0):
+        self.stages = stages
+        self.result_timeout = result_timeout
+        self.zones = zones
+        self.fire_filter = fire_filter
+        self.trackers = trackers or {}
+        self.overlay = overlay
+        self.pose = pose
+        self.persons = persons
+        self.metrics = metrics or no_metrics()
+        self.gate = gate
+        self.pose_every = max(1, pose_every)
+        self.backend = backend or local_backend()
+        self.key = key
+        self._frame_count = 0
+
+    @classmethod
+    def from_camera(cls, camera, detectors, rates=None, backend=None, metrics=None, tracking=None,
+                    zone_check="foot", zone_min_overlap=0.3, fire_filter=None, result_timeout=30.0):
+        """
+        build the plan for a Camera row (or anything with the same flags).
+
+        Args:
+        camera: object with restricted_zone, fire_detection,
+                safety_gear_detection and pose_alert flags, and
+                optionally motion_gate / motion_max_staleness and zones
+                (JSON polygons, see models.zones.parse_zones).
+        detectors: dict with "restricted_zone", "fire", "gear" and "pose".
+        rates: optional dict of alert name -> run every n-th frame.
+        backend: optional inference backend shared by all cameras.
+        metrics: optional camera_metrics for the plan's stages.
+        tracking: optional dict of alert name -> keyframe interval for the
+                  stages to run in detect-then-track mode; a stage's entry
+                  in rates overrides it.
+        zone_check, zone_min_overlap: how people are tested against the
+                  camera's zones, see zone_set.
+        fire_filter: optional dict of fire_prefilter arguments; each camera
+                  with fire detection gets its own prefilter built from it.
+        result_timeout: seconds a stage waits for its model, see above.
+        """
+        tracking = tracking or {}
+        # an explicit rate wins over the default keyframe interval
+        rates = {**tracking, **(rates or {})}
+        stages = []
+        if camera.restricted_zone:
+            stages.append(("restricted_zone_breach", detectors["restricted_zone"]))
+        if camera.fire_detection:
+            stages.append(("fire_detection", detectors["fire"]))
+        if camera.safety_gear_detection:
+            stages.append(("gear_detection", detectors["gear"]))
+        trackers = {alert_name: box_tracker(high_conf=detector.confidence)
+                    for alert_name, detector in stages if alert_name in tracking}
+        stages = [(alert_name, detector, max(1, rates.get(alert_name, 1))) for alert_name, detector in stages]
+
+        overlay = detectors["restricted_zone"] if camera.restricted_zone else None
+        pose = detectors["pose"] if camera.pose_alert else None
+        persons = detectors["restricted_zone"] if pose is not None else None
+
+        gate = None
+        if getattr(camera, "motion_gate", False) and (stages or pose):
+            gate = motion_gate(max_staleness=getattr(camera, "motion_max_staleness", None) or 5.0)
+        zones = None
+        if camera.restricted_zone:
+            try:
+                zones = zone_set(parse_zones(getattr(camera, "zones", None)), check=zone_check,
+                                 min_overlap=zone_min_overlap) or None
+            except ValueError as e:
+                print(f"Ignoring invalid zones of camera {getattr(camera, 'cam_id', None)}: {e}")
+        prefilter = fire_prefilter(**fire_filter) if fire_filter is not None and camera.fire_detection else None
+        key = (getattr(camera, "user_id", None), getattr(camera, "cam_id", None))
+        return cls(stages, overlay=overlay, pose=pose, gate=gate, pose_every=rates.get("pose_alert", 1),
+                   backend=backend, key=key, persons=persons, metrics=metrics, trackers=trackers,
+                   zones=zones, fire_filter=prefilter, result_timeout=result_timeout)
+
+    @staticmethod
+    def required(camera):
+        """keys of the detectors dict a camera's plan runs, e.g. to load them ahead of its first frame"""
+        names = []
+        if camera.restricted_zone or camera.pose_alert:
+            # the pose stage crops people found by the zone's person detector
+            names.append("restricted_zone")
+        if camera.fire_detection:
+            names.append("fire")
+        if camera.safety_gear_detection:
+            names.append("gear")
+        if camera.pose_alert:
+            names.append("pose")
+        return names
+
+    @staticmethod
+    def _label_tracks(frame, rows, boxes):
+        """draw the track id above each box postprocess kept and return those ids"""
+        ids = {tuple(map(int, row[:4])): int(row[6]) for row in rows}
+        track_ids = []
+        for box in boxes:
+            track_id = ids.get(tuple(box))
+            if track_id is not None:
+                track_ids.append(track_id)
+                cv2.putText(frame, f"#{track_id}", (box[0], max(box[1] - 28, 12)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        return track_ids
+
+    def __bool__(self):
+        return bool(self.stages or self.overlay or self.pose)
+
+    def _fire_possible(self, frame):
+        """whether the fire prefilter lets the fire model run on frame"""
+        start = time.perf_counter()
+        run = self.fire_filter.check(frame)
+        self.metrics.stage("fire_prefilter", time.perf_counter() - start)
+        if not run:
+            self.metrics.count("fire_prefiltered")
+        return run
+
+    def run(self, frame, on_detection=None, source=None):
+        """
+        run the enabled stages on frame and return the annotated frame.
+
+        on_detection(results, frame, alert_name) is called for every
+        positive stage with the frame as it looks at that point; tracked
+        stages call it only when a track alerts for the first time, with
+        track_ids=[ids of the new tracks].
+
+        source is the frame as captured, if frame is a resized copy for
+        display: the models run on source, letterboxed once per input size,
+        and their boxes are mapped back onto frame.
+        """
+        metrics = self.metrics
+        if self.gate is not None:
+            start = time.perf_counter()
+            moving = self.gate.check(frame)
+            metrics.stage("motion_gate", time.perf_counter() - start)
+            if not moving:
+                # static scene: keep the overlay, skip every model
+                metrics.count("frames_gated")
+                if self.overlay is not None:
+                    frame = self.overlay.draw_zone_overlay(frame, self.zones)
+                return frame
+
+        count = self._frame_count
+        self._frame_count += 1
+
+        # queue every model due this frame first so the batching engines can
+        # run them concurrently, then collect in order
+        due, tracked = [], []
+        for alert_name, detector, every in self.stages:
+            if count % every == 0:
+                if alert_name == "fire_detection" and self.fire_filter is not None and not self._fire_possible(frame):
+                    continue
+                due.append((alert_name, detector))
+            elif alert_name in self.trackers:
+                tracked.append((alert_name, detector))
+        pose_due = self.pose is not None and count % self.pose_every == 0
+        # pose runs on person crops; borrow the zone stage's person model
+        # when neither it nor its tracker supplies people this frame
+        person_only = (pose_due and self.persons is not None
+                       and not any(alert_name == "restricted_zone_breach" for alert_name, _ in due + tracked))
+        if person_only:
+            due.append(("restricted_zone_breach", self.persons))
+        # the models get letterboxed copies, so drawing on frame below is safe
+        if due or pose_due:
+            metrics.count("frames_inferred")
+        source = frame if source is None else source
+        start = time.perf_counter()
+        inputs = {}
+        for _, detector in due:
+            if detector.imgsz not in inputs:
+                inputs[detector.imgsz] = model_input(source, detector.imgsz, stride=input_stride(detector.model_path))
+        metrics.stage("letterbox", time.perf_counter() - start)
+        futures = self.backend.submit(self.key, inputs, due)
+        pending = [(alert_name, detector, future) for (alert_name, detector), future in zip(due, futures)]
+
+        if self.overlay is not None:
+            start = time.perf_counter()
+            frame = self.overlay.draw_zone_overlay(frame, self.zones)
+            metrics.stage("overlay", time.perf_counter() - start)
+
+        person_boxes = None
+        # between keyframes the tracked stages get their boxes from the tracker
+        stages = pending + [(alert_name, detector, None) for alert_name, detector in tracked]
+        for index, (alert_name, detector, future) in enumerate(stages):
+            try:
+                start = time.perf_counter()
+                if future is not None:
+                    # the models run concurrently, so this is the wait left after the stages before
+                    data = detections(future.result(timeout=self.result_timeout))
+                    metrics.stage(f"infer:{alert_name}", time.perf_counter() - start)
+                    start = time.perf_counter()
+                    data = inputs[detector.imgsz].to_display(data, frame.shape)
+                tracker = self.trackers.get(alert_name)
+                if tracker is not None:
+                    rows = tracker.update(data) if future is not None else tracker.predict()
+                    metrics.stage(f"track:{alert_name}", time.perf_counter() - start)
+                    start = time.perf_counter()
+                    data = rows[:, :6]
+                result = remote_result(data)
+                if detector is self.persons and alert_name == "restricted_zone_breach":
+                    person_boxes = self.persons.persons(result)
+                    if person_only and index == len(pending) - 1:
+                        continue
+                if alert_name == "restricted_zone_breach":
+                    results = detector.postprocess(frame, result, zones=self.zones)
+                else:
+                    results = detector.postprocess(frame, result)
+                metrics.stage(f"postprocess:{alert_name}", time.perf_counter() - start)
+            except Exception as e:
+                print(f"Error in {alert_name}: {e}")
+                metrics.count("detector_errors", detector=alert_name)
+                continue
+            if results[0] and tracker is not None:
+                track_ids = self._label_tracks(frame, rows, results[1])
+                # one alert per tracked object, raised once it is confirmed
+                new_tracks = tracker.claim_alerts(track_ids)
+                if new_tracks and on_detection is not None:
+                    on_detection(results, frame, alert_name, track_ids=new_tracks)
+            elif results[0] and on_detection is not None:
+                on_detection(results, frame, alert_name)
+
+        if pose_due:
+            start = time.perf_counter()
+            frame, detected = self.pose(frame, key=self.key, person_boxes=person_boxes)
+            metrics.stage("pose", time.perf_counter() - start)
+            if detected and on_detection is not None:
+                on_detection((True, []), frame, "pose_alert")
+
+        return frame
@@ -1,26 +1,51 @@
-from ultralytics import YOLO
 import cv2
-from playsound import playsound
 import threading
+from models.audio_dispatcher import alert_sounds
+from models.inference_engine import inference_engine
 
 class fire_detection():
     
-    def __init__(self, model_path, conf=0.85, sound_path="./static/audio/fire_alarm.mp3"):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, conf=0.85, sound_path="./static/audio/fire_alarm.mp3", imgsz=640):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self._model = None
+        self._model_lock = threading.Lock()
         self.confidence = conf
         self.sound_path = sound_path
+        self.engine = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    # importing ultralytics pulls in torch, so it waits for the first load too
+                    from ultralytics import YOLO
+                    # task is required for exported (ONNX/OpenVINO) models
+                    self._model = YOLO(self.model_path, task="detect")
+        return self._model
+
+    def enable_batching(self, max_batch=8, max_wait=0.01):
+        self.engine = inference_engine(lambda: self.model, max_batch=max_batch, max_wait=max_wait,
+                                       imgsz=self.imgsz)
+
+    def submit(self, img):
+        if self.engine is None:
+            return inference_engine.run_now(self.model, img, self.imgsz)
+        return self.engine.submit(img)
 
     def play_alert_sound(self):
-        threading.Thread(target=playsound, args=(self.sound_path,), daemon=True).start()
+        alert_sounds.play("fire_detection", self.sound_path)
 
     def process(self, img, flag=True):
         if not flag:
             return (False, [])
 
-        bb_boxes = []
-        result = self.model(img, verbose=False)
+        return self.postprocess(img, self.submit(img).result())
 
-        for box in result[0].boxes:
+    def postprocess(self, img, result):
+        bb_boxes = []
+        for box in result.boxes:
             if float(box.conf[0]) > self.confidence:
                 bb = list(map(int, box.xyxy[0]))
                 bb_boxes.append(bb)
@@ -0,0 +1,83 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class fire_prefilter:
+    """
+    this class decides whether a frame can contain fire before the fire
+    model is run on it. a small copy of the frame is thresholded in HSV for
+    flame colours (red-orange-yellow, saturated and bright) and, since
+    flames flicker while orange clothing and signs do not, the brightness
+    of those pixels has to change between frames too. the model still runs
+    at least every max_staleness seconds, so a fire the filter misses is
+    only found late, never missed.
+
+    Args:
+    hue_max: highest OpenCV hue (0-179) counted as flame coloured.
+    min_saturation: lowest saturation (0-255) of flame pixels.
+    min_value: lowest brightness (0-255) of flame pixels.
+    min_fraction: fraction of flame pixels a frame needs.
+    flicker_threshold: brightness change (0-255) for a flame pixel to count as flickering.
+    min_flicker: fraction of the flame pixels that must flicker; 0 disables the flicker test.
+    max_staleness: maximum seconds between two runs of the model.
+    hold: seconds the model keeps running after a frame passed.
+    width: width of the downscaled frame the filter looks at.
+    """
+    def __init__(self, hue_max=35, min_saturation=100, min_value=150, min_fraction=0.0005,
+                 flicker_threshold=20, min_flicker=0.1, max_staleness=2.0, hold=2.0, width=160):
+        self.lower = np.array([0, min_saturation, min_value], dtype=np.uint8)
+        self.upper = np.array([hue_max, 255, 255], dtype=np.uint8)
+        self.min_fraction = min_fraction
+        self.flicker_threshold = flicker_threshold
+        self.min_flicker = min_flicker
+        self.max_staleness = max_staleness
+        self.hold = hold
+        self.width = width
+
+        self.passed = False  # whether the last checked frame passed the filter itself
+        self._previous = None  # brightness of the previous small frame
+        self._last_pass = None
+        self._last_run = None
+
+    def candidates(self, frame):
+        """
+        (flame pixel fraction, flickering fraction of those) of frame; the
+        first frame, with nothing to compare against, counts as flickering.
+        """
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, round(height * self.width / width))),
+                           interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.lower, self.upper)
+        value = hsv[:, :, 2]
+        previous, self._previous = self._previous, value
+
+        flame = np.count_nonzero(mask)
+        if not flame:
+            return 0.0, 0.0
+        if previous is None or previous.shape != value.shape:
+            return flame / mask.size, 1.0
+        changed = cv2.absdiff(value, previous) > self.flicker_threshold
+        return flame / mask.size, np.count_nonzero(changed & (mask > 0)) / flame
+
+    def passes(self, frame):
+        """True if frame looks like it could contain fire"""
+        fraction, flicker = self.candidates(frame)
+        return bool(fraction >= self.min_fraction and flicker >= self.min_flicker)
+
+    def check(self, frame, now=None):
+        """True if the fire model should run on this frame"""
+        now = time.monotonic() if now is None else now
+        self.passed = self.passes(frame)
+        if self.passed:
+            self._last_pass = now
+
+        run = (self._last_run is None
+               or (self._last_pass is not None and now - self._last_pass <= self.hold)
+               or now - self._last_run >= self.max_staleness)
+        if run:
+            self._last_run = now
+        return run
+
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import cv2
+
+from models.metrics import no_metrics
+
+
+class frame_grabber:
+    """
+    this class reads a camera continuously in its own thread, so a stalled
+    network stream never blocks inference or encoding. frames are decoded
+    into a small ring of reused buffers and the consumer always gets the
+    freshest one. a dropped stream is reopened with exponential backoff.
+
+    Args:
+    open_capture: callable() returning an opened cv2.VideoCapture, raising
+                  when the camera cannot be opened.
+    buffer_size: number of frame buffers in the ring (at least 3).
+    backoff: seconds before the first reconnect attempt.
+    max_backoff: upper bound on the delay between reconnect attempts.
+    metrics: camera_metrics receiving capture timings and counts, or None.
+    """
+    def __init__(self, open_capture, buffer_size=3, backoff=0.5, max_backoff=30.0, metrics=None):
+        self.open_capture = open_capture
+        self.metrics = metrics or no_metrics()
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+        self.frames_read = 0
+        self.fps = None
+
+        self._slots = [None] * max(3, buffer_size)
+        self._latest = None   # slot holding the freshest frame
+        self._leased = None   # slot currently handed out to the consumer
+        self._seq = 0
+        self._cap = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self._cap is not None
+
+    def start(self):
+        """open the first capture in the calling thread so a bad camera fails fast"""
+        self._connect(self.open_capture())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _connect(self, cap):
+        self._cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+
+    def _disconnect(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def _reconnect(self):
+        delay = self.backoff
+        while not self._stop.wait(delay):
+            try:
+                self._connect(self.open_capture())
+                self.reconnects += 1
+                self.metrics.count("reconnects")
+                return True
+            except Exception as e:
+                delay = min(delay * 2, self.max_backoff)
+                print(f"Reconnect failed, retrying in {delay:.1f}s: {e}")
+        return False
+
+    def _free_slot(self):
+        with self._cond:
+            busy = (self._latest, self._leased)
+        for index in range(len(self._slots)):
+            if index not in busy:
+                return index
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                index = self._free_slot()
+                ok = self._cap.grab()
+                if ok:
+                    # retrieve() decodes into the slot's buffer once it has the right shape
+                    start = time.perf_counter()
+                    ok, frame = self._cap.retrieve(self._slots[index])
+                    self.metrics.stage("decode", time.perf_counter() - start)
+                if not ok:
+                    print("Camera stream lost, reconnecting")
+                    self._disconnect()
+                    if not self._reconnect():
+                        break
+                    continue
+
+                with self._cond:
+                    self._slots[index] = frame
+                    self._latest = index
+                    self._seq += 1
+                    self.frames_read += 1
+                    self._cond.notify_all()
+                self.metrics.count("frames_read")
+        finally:
+            self._disconnect()
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+
+    def read(self, after=0, timeout=1.0):
+        """
+        wait for a frame newer than sequence number `after`.
+
+        Returns:
+        (seq, frame) for the freshest frame, or (after, None) on timeout or
+        once the grabber has stopped. the frame buffer stays valid until the
+        next call to read().
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after or self._stop.is_set(), timeout)
+            if self._seq <= after:
+                return after, None
+            self._leased = self._latest
+            return self._seq, self._slots[self._leased]
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
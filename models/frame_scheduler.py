@@ -0,0 +1,41 @@
+import math
+
+
+class frame_scheduler:
+    """
+    this class decides how many captured frames to drop before the next one
+    is processed, from a rolling estimate of how long processing takes. when
+    the pipeline falls behind, stale frames are dropped instead of queueing
+    up, so the frame that gets processed is always the freshest one.
+
+    Args:
+    source_fps: frame rate the camera delivers.
+    min_skip: process at most every min_skip-th frame, even when idle.
+    max_skip: never drop more than max_skip - 1 frames in a row.
+    smoothing: weight of the newest sample in the latency estimate.
+    """
+    def __init__(self, source_fps=30, min_skip=2, max_skip=30, smoothing=0.2):
+        self.source_fps = source_fps if source_fps and source_fps > 0 else 30
+        self.min_skip = max(1, min_skip)
+        self.max_skip = max(self.min_skip, max_skip)
+        self.smoothing = smoothing
+        self.latency = None
+
+    def record(self, seconds):
+        """add the processing time of one frame to the rolling estimate"""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+
+    @property
+    def skip(self):
+        """process every skip-th frame"""
+        if self.latency is None:
+            return self.min_skip
+        # frames that arrive while one is being processed are already stale
+        behind = math.ceil(self.latency * self.source_fps)
+        return min(max(self.min_skip, behind), self.max_skip)
+
+    def frames_to_drop(self):
+        return self.skip - 1
@@ -0,0 +1,70 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class inference_engine:
+    """
+    this class batches frames submitted by many camera workers into a single
+    forward pass of one YOLO model. a batch is run as soon as max_batch frames
+    are waiting or the oldest one has waited max_wait seconds.
+
+    Args:
+    load_model: callable returning the ultralytics YOLO model (which accepts
+                a list of images); called from the engine thread so the model
+                is only loaded once frames actually arrive.
+    max_batch: maximum number of frames in one forward pass.
+    max_wait: maximum seconds a frame waits for the batch to fill.
+    imgsz: model input size the frames are run at.
+    """
+    def __init__(self, load_model, max_batch=8, max_wait=0.01, imgsz=640):
+        self.load_model = load_model
+        self.imgsz = imgsz
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="inference-engine", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def run_now(model, img, imgsz=640):
+        """run a single frame synchronously, wrapped in a completed future"""
+        future = Future()
+        try:
+            future.set_result(model(img, verbose=False, imgsz=imgsz)[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit(self, img):
+        """queue img for the next batch; returns a future of its YOLO result"""
+        future = Future()
+        self._queue.put((img, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.load_model()([img for img, _ in batch], verbose=False, imgsz=self.imgsz)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,163 @@
+import bisect
+import threading
+
+# seconds; covers sub-millisecond postprocessing up to a stalled model
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class counter:
+    """a monotonically increasing count, one series per label set"""
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=None, amount=1):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, labels, value) for labels, value in sorted(values.items())]
+
+
+class histogram:
+    """
+    cumulative bucket counts, sum and count of observed values, one series
+    per label set, as Prometheus histograms expose them.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=None):
+        key = tuple(sorted((labels or {}).items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        samples = []
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                samples.append((self.name + "_bucket", labels + (("le", bound),), cumulative))
+            samples.append((self.name + "_sum", labels, values[-1]))
+            samples.append((self.name + "_count", labels, cumulative))
+        return samples
+
+
+class gauge_callback:
+    """a gauge (or counter) whose series are read from callback() at scrape time"""
+    def __init__(self, name, help, callback, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, tuple(sorted(labels.items())), value) for labels, value in self.callback()]
+
+
+class metrics_registry:
+    """
+    this class keeps the app's metrics and renders them in the Prometheus
+    text format for /metrics. metrics are created on first use, so hooks can
+    ask for them by name.
+
+    Args:
+    prefix: prepended to every metric name.
+    """
+    def __init__(self, prefix="industrial_ai"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            return metric
+
+    def counter(self, name, help=""):
+        return self._get(counter, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(histogram, name, help, buckets=buckets)
+
+    def register_callback(self, name, help, callback, kind="gauge"):
+        """callback() returns a list of (labels dict, value) read when scraped"""
+        self._get(gauge_callback, name, help, callback=callback, kind=kind)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class no_metrics:
+    """stand-in for camera_metrics when nothing is collected"""
+    def stage(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1, **labels):
+        pass
+
+
+class camera_metrics:
+    """
+    the timing and counting hooks handed to one camera's worker, frame
+    grabber and detector plan; every sample is labelled with the camera.
+
+    Args:
+    registry: metrics_registry the samples go to.
+    camera: label value identifying the camera, e.g. its row id "3".
+    """
+    def __init__(self, registry, camera):
+        self.registry = registry
+        self.camera = camera
+        self._stage_seconds = registry.histogram("stage_seconds", "Time spent per pipeline stage.")
+
+    def stage(self, name, seconds):
+        self._stage_seconds.observe(seconds, {"camera": self.camera, "stage": name})
+
+    def count(self, name, amount=1, **labels):
+        """add to the per-camera counter <name>_total"""
+        self.registry.counter(f"{name}_total", f"Per-camera count of {name.replace('_', ' ')}.").inc(
+            {"camera": self.camera, **labels}, amount)
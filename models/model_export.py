@@ -0,0 +1,195 @@
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from models.preprocess import letterbox
+
+# "pt" runs the PyTorch weights as shipped, the others run CPU-optimized exports
+MODEL_FORMATS = ("pt", "onnx", "onnx-int8", "openvino", "openvino-int8")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def exported_path(weights, model_format):
+    """where the export of weights in model_format lives, next to the .pt file"""
+    root, _ = os.path.splitext(weights)
+    return {
+        "pt": weights,
+        "onnx": root + ".onnx",
+        "onnx-int8": root + ".int8.onnx",
+        "openvino": root + "_openvino_model",
+        "openvino-int8": root + "_int8_openvino_model",
+    }[model_format]
+
+
+def resolve_weights(weights, model_format):
+    """
+    the model file the detectors should load for model_format, falling back
+    to the .pt weights (with a warning) until the export has been made.
+    """
+    path = exported_path(weights, model_format)
+    if model_format != "pt" and not os.path.exists(path):
+        print(f"{path} not found, using {weights}; run `flask export-models --format {model_format}`")
+        return weights
+    return path
+
+
+def supports_batching(path):
+    """OpenVINO exports have a fixed batch size of one, ONNX exports are dynamic"""
+    return not path.rstrip("/\\").endswith("_openvino_model")
+
+
+def input_stride(path):
+    """
+    the stride PyTorch weights pad their input to, so they take rectangular
+    frames; None for exports, which are traced at a fixed square shape
+    """
+    return 32 if path.endswith(".pt") else None
+
+
+def list_images(folder):
+    return sorted(path for path in glob.glob(os.path.join(folder, "*"))
+                  if path.lower().endswith(IMAGE_EXTENSIONS))
+
+
+class calibration_reader:
+    """
+    feeds sample images to onnxruntime's static quantizer, preprocessed the
+    way the exported graph expects (RGB, NCHW, scaled to 0..1).
+    """
+    def __init__(self, input_name, images, size=640):
+        self.input_name = input_name
+        self.images = iter(images)
+        self.size = size
+
+    def get_next(self):
+        for path in self.images:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            tensor = cv2.cvtColor(letterbox(img, self.size)[0], cv2.COLOR_BGR2RGB)
+            tensor = tensor.transpose(2, 0, 1)[None].astype(np.float32) / 255
+            return {self.input_name: tensor}
+        return None
+
+
+def export_model(weights, model_format, imgsz=640, data=None, calibration=None):
+    """
+    export weights to model_format and return the path of the exported model.
+
+    Args:
+    weights: path of the .pt weights.
+    model_format: one of MODEL_FORMATS except "pt".
+    imgsz: input size of the exported graph.
+    data: dataset yaml used to calibrate OpenVINO INT8 (ultralytics' default
+          dataset when None).
+    calibration: folder of sample images used to calibrate ONNX INT8; without
+                 it weights are quantized dynamically.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    if model_format in ("openvino", "openvino-int8"):
+        kwargs = {"format": "openvino", "imgsz": imgsz}
+        if model_format == "openvino-int8":
+            kwargs["int8"] = True
+            if data:
+                kwargs["data"] = data
+        model.export(**kwargs)
+        return exported_path(weights, model_format)
+
+    onnx_path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if model_format == "onnx":
+        return onnx_path
+
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    import onnxruntime
+
+    output = exported_path(weights, model_format)
+    images = list_images(calibration) if calibration else []
+    if images:
+        input_name = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        quantize_static(onnx_path, output, calibration_reader(input_name, images, imgsz),
+                        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8)
+    else:
+        quantize_dynamic(onnx_path, output, weight_type=QuantType.QUInt8)
+    return output
+
+
+def box_iou_matrix(a, b):
+    """IoU of every box in a (N x 4, xyxy) with every box in b (M x 4)"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_detections(reference, exported, iou=0.5):
+    """
+    greedily pair detections of the same class by IoU.
+
+    Args:
+    reference, exported: (N, 6) arrays of x1, y1, x2, y2, conf, class.
+
+    Returns:
+    list of (reference index, exported index) pairs.
+    """
+    if not len(reference) or not len(exported):
+        return []
+    overlap = box_iou_matrix(reference[:, :4], exported[:, :4])
+    overlap[reference[:, 5][:, None] != exported[:, 5][None, :]] = 0
+    pairs = []
+    while True:
+        r, e = np.unravel_index(np.argmax(overlap), overlap.shape)
+        if overlap[r, e] < iou:
+            return pairs
+        pairs.append((int(r), int(e)))
+        overlap[r, :] = 0
+        overlap[:, e] = 0
+
+
+def check_parity(weights, model_format, images, conf=0.25, iou=0.5):
+    """
+    run the .pt weights and their export on the same images and compare.
+
+    Returns:
+    dict with detection counts, recall and precision of the export against
+    the PyTorch model, the mean confidence difference of matched boxes and
+    the mean inference time of both.
+    """
+    from ultralytics import YOLO
+
+    reference_model = YOLO(weights)
+    exported_model = YOLO(exported_path(weights, model_format), task="detect")
+    totals = {"reference": 0, "exported": 0, "matched": 0}
+    conf_deltas, times = [], {"reference": [], "exported": []}
+
+    for path in images:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        outputs = {}
+        for name, model in (("reference", reference_model), ("exported", exported_model)):
+            start = time.perf_counter()
+            result = model(img, conf=conf, verbose=False)[0]
+            times[name].append(time.perf_counter() - start)
+            outputs[name] = result.boxes.data.cpu().numpy()
+            totals[name] += len(outputs[name])
+        pairs = match_detections(outputs["reference"], outputs["exported"], iou=iou)
+        totals["matched"] += len(pairs)
+        conf_deltas.extend(abs(outputs["reference"][r, 4] - outputs["exported"][e, 4]) for r, e in pairs)
+
+    return {
+        "images": len(times["reference"]),
+        **totals,
+        "recall": totals["matched"] / totals["reference"] if totals["reference"] else 1.0,
+        "precision": totals["matched"] / totals["exported"] if totals["exported"] else 1.0,
+        "mean_conf_delta": float(np.mean(conf_deltas)) if conf_deltas else 0.0,
+        "reference_ms": 1000 * float(np.mean(times["reference"][1:] or times["reference"] or [0])),
+        "exported_ms": 1000 * float(np.mean(times["exported"][1:] or times["exported"] or [0])),
+    }
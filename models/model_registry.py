@@ -0,0 +1,76 @@
+import threading
+import time
+
+
+class model_registry:
+    """
+    this class loads models on first use instead of at import time, so the
+    web app serves requests while weights are still loading, and records
+    each model's load state for the health endpoint.
+
+    a loader is any callable that loads one model; a loader returning False
+    marks the model "unavailable" (e.g. an optional library is missing).
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        self._entries[name] = {"loader": loader, "state": "not loaded", "error": None,
+                               "load_seconds": None, "done": threading.Event()}
+
+    def load(self, name):
+        """
+        load name in the calling thread, or wait for the thread already
+        loading it. a failed load is retried on the next call.
+
+        Returns:
+        True once the model is ready.
+        """
+        entry = self._entries[name]
+        with self._lock:
+            start = entry["state"] in ("not loaded", "failed")
+            if start:
+                entry["state"] = "loading"
+                entry["done"].clear()
+        if not start:
+            entry["done"].wait()
+            return entry["state"] == "ready"
+
+        began = time.monotonic()
+        try:
+            loaded = entry["loader"]()
+            entry["state"] = "unavailable" if loaded is False else "ready"
+            entry["error"] = None
+        except Exception as e:
+            print(f"Failed to load model {name}: {e}")
+            entry["state"] = "failed"
+            entry["error"] = str(e)
+        finally:
+            entry["load_seconds"] = round(time.monotonic() - began, 3)
+            entry["done"].set()
+        return entry["state"] == "ready"
+
+    def warm(self, names, background=True):
+        """load names now; in a background thread unless background is False"""
+        names = [name for name in names if self._entries[name]["state"] in ("not loaded", "failed")]
+        if not names:
+            return
+        if not background:
+            for name in names:
+                self.load(name)
+            return
+        threading.Thread(target=lambda: [self.load(name) for name in names],
+                         name="model-warmup", daemon=True).start()
+
+    @property
+    def names(self):
+        return list(self._entries)
+
+    def ready(self, names):
+        """True once every model in names has finished loading successfully"""
+        return all(self._entries[name]["state"] in ("ready", "unavailable") for name in names)
+
+    def status(self):
+        return {name: {"state": entry["state"], "load_seconds": entry["load_seconds"], "error": entry["error"]}
+                for name, entry in self._entries.items()}
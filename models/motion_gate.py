@@ -0,0 +1,60 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class motion_gate:
+    """
+    this class decides whether a frame is worth running the detectors on, by
+    differencing a small blurred grayscale copy against the previous one.
+    static frames are skipped, but inference still runs at least every
+    max_staleness seconds so a slowly growing fire is never missed.
+
+    Args:
+    threshold: grayscale difference (0-255) for a pixel to count as changed.
+    min_changed: fraction of changed pixels that counts as motion.
+    max_staleness: maximum seconds between two inferences.
+    hold: seconds inference keeps running after motion stops.
+    width: width of the downscaled frame used for differencing.
+    """
+    def __init__(self, threshold=25, min_changed=0.01, max_staleness=5.0, hold=2.0, width=160):
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.max_staleness = max_staleness
+        self.hold = hold
+        self.width = width
+
+        self._previous = None
+        self._last_motion = None
+        self._last_inference = None
+
+    def _downscale(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def motion(self, frame):
+        """fraction of pixels that changed since the previous frame"""
+        small = self._downscale(frame)
+        previous, self._previous = self._previous, small
+        if previous is None or previous.shape != small.shape:
+            return 1.0
+        changed = np.count_nonzero(cv2.absdiff(small, previous) > self.threshold)
+        return changed / small.size
+
+    def check(self, frame, now=None):
+        """True if the detectors should run on this frame"""
+        now = time.monotonic() if now is None else now
+        if self.motion(frame) >= self.min_changed:
+            self._last_motion = now
+
+        run = (self._last_inference is None
+               or (self._last_motion is not None and now - self._last_motion <= self.hold)
+               or now - self._last_inference >= self.max_staleness)
+        if run:
+            self._last_inference = now
+        return run
@@ -1,69 +1,298 @@
 import cv2
 import numpy as np
-import math
-from playsound import playsound
+import time
 import threading
+from models.audio_dispatcher import alert_sounds
+from collections import deque
 
-# Try to import mediapipe with more detailed error handling
-try:
-    import mediapipe as mp
-    MEDIAPIPE_AVAILABLE = True
+# Constants
+STRAIGHT_ARM_THRESHOLD = 160
+VERTICAL_THRESH = 20
+HORIZONTAL_THRESH = 25
+MIN_VISIBILITY = 0.7
+
+# MediaPipe Pose landmark indices of (shoulder, elbow, wrist), left arm then right
+ARM_JOINTS = np.array([[11, 13, 15], [12, 14, 16]])
+NUM_LANDMARKS = 33
+
+# MediaPipe is imported by load_mediapipe() on first use, not at import time
+MEDIAPIPE_AVAILABLE = None
+mp_pose = None
+mp_drawing = None
+_mediapipe_lock = threading.Lock()
+
+def load_mediapipe():
+    """
+    Import MediaPipe the first time pose detection is needed.
     
-    # Constants
-    STRAIGHT_ARM_THRESHOLD = 160
-    VERTICAL_THRESH = 20
-    HORIZONTAL_THRESH = 25
-    MIN_VISIBILITY = 0.7
-
-    mp_pose = mp.solutions.pose
-    mp_drawing = mp.solutions.drawing_utils
-    pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    Returns:
+        bool: True if MediaPipe is usable, False for the fallback mode
+    """
+    global MEDIAPIPE_AVAILABLE, mp_pose, mp_drawing
+    if MEDIAPIPE_AVAILABLE is not None:
+        return MEDIAPIPE_AVAILABLE
+    with _mediapipe_lock:
+        if MEDIAPIPE_AVAILABLE is not None:
+            return MEDIAPIPE_AVAILABLE
+        # Try to import mediapipe with more detailed error handling
+        try:
+            import mediapipe as mp
+
+            mp_pose = mp.solutions.pose
+            mp_drawing = mp.solutions.drawing_utils
+            MEDIAPIPE_AVAILABLE = True
+            
+            print("✅ MediaPipe successfully loaded for pose detection")
+            
+        except ImportError as e:
+            print(f"❌ MediaPipe import failed: {e}")
+            print("📝 Note: MediaPipe may not be compatible with this environment")
+            print("🔄 Falling back to dummy pose detection")
+            MEDIAPIPE_AVAILABLE = False
+        except Exception as e:
+            print(f"❌ MediaPipe initialization failed: {e}")
+            print("🔄 Falling back to dummy pose detection")
+            MEDIAPIPE_AVAILABLE = False
+        return MEDIAPIPE_AVAILABLE
+
+
+def box_iou(a, b):
+    """intersection over union of two [x1, y1, x2, y2] boxes"""
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class pose_pool:
+    """
+    Per-camera MediaPipe pose estimators.
     
-    print("✅ MediaPipe successfully loaded for pose detection")
+    MediaPipe Pose tracks a single person between calls, so one shared
+    instance mixes up every stream that uses it. The pool keeps estimators
+    per camera and, within a camera, per person: each person box is matched
+    to the estimator that saw the most overlapping box on the previous
+    frame, so tracking continues frame to frame. Estimators are created on
+    first use and closed once their camera has been idle for idle_timeout.
+    """
+    def __init__(self, max_people=4, idle_timeout=60.0, match_iou=0.3):
+        self.max_people = max_people
+        self.idle_timeout = idle_timeout
+        self.match_iou = match_iou
+        self._cameras = {}  # key -> {"slots": [[last_box, estimator, person_id]], "lock", "used"}
+        self._lock = threading.Lock()
+        self._next_person = 0
+
+    @staticmethod
+    def _create():
+        return mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+    def _camera(self, key):
+        now = time.monotonic()
+        with self._lock:
+            for stale in [k for k, cam in self._cameras.items()
+                          if k != key and now - cam["used"] > self.idle_timeout]:
+                self._close(self._cameras.pop(stale))
+            cam = self._cameras.get(key)
+            if cam is None:
+                cam = {"slots": [], "lock": threading.Lock(), "used": now}
+                self._cameras[key] = cam
+            cam["used"] = now
+            return cam
+
+    @staticmethod
+    def _close(cam):
+        with cam["lock"]:
+            for _, estimator, _ in cam["slots"]:
+                estimator.close()
+            cam["slots"] = []
+
+    def assign(self, slots, boxes):
+        """
+        match boxes to slots by IoU with each slot's previous box; returns slot
+        indices. a slot handed to an unmatched box gets a new person id.
+        """
+        pairs = sorted(((box_iou(box, slot[0]), b, s) for b, box in enumerate(boxes)
+                        for s, slot in enumerate(slots) if slot[0] is not None), reverse=True)
+        assigned, taken = {}, set()
+        for iou, b, s in pairs:
+            if iou < self.match_iou:
+                break
+            if b not in assigned and s not in taken:
+                assigned[b] = s
+                taken.add(s)
+
+        free = [s for s in range(len(slots)) if s not in taken]
+        indices = []
+        for b in range(len(boxes)):
+            if b not in assigned:
+                if free:
+                    assigned[b] = free.pop(0)
+                else:
+                    slots.append([None, self._create(), None])
+                    assigned[b] = len(slots) - 1
+                slots[assigned[b]][2] = self._next_person
+                self._next_person += 1
+            indices.append(assigned[b])
+        return indices
+
+    def run(self, key, images, boxes):
+        """
+        Run pose estimation on RGB crops of one camera.
+        
+        Args:
+            key: Camera identity, e.g. (user_id, cam_id)
+            images: RGB images, one per person
+            boxes: Frame-space box of each image, used to keep tracking per person
+            
+        Returns:
+            tuple: (person_ids, results), one of each per image; a person
+            keeps its id for as long as it is tracked
+        """
+        cam = self._camera(key)
+        with cam["lock"]:
+            slots = cam["slots"]
+            indices = self.assign(slots, boxes)
+            results = []
+            for image, box, index in zip(images, boxes, indices):
+                slots[index][0] = box
+                results.append(slots[index][1].process(image))
+            person_ids = [slots[index][2] for index in indices]
+            # a person that left the view must not seed tracking for a newcomer
+            for index, slot in enumerate(slots):
+                if index not in indices:
+                    slot[0] = None
+            return person_ids, results
+
+
+pose_estimators = pose_pool()
+
+def play_pose_alert_sound(sound_path="./static/audio/fire_alarm.mp3"):
+    """Queue the pose alert sound on the shared, rate-limited audio dispatcher"""
+    alert_sounds.play("pose_alert", sound_path)
+
+def landmark_array(results, sizes=None):
+    """
+    Stack MediaPipe results into an (N, 33, 4) array of x, y, z, visibility.
+    People without landmarks are all NaN, which classifies as not an L-pose.
+
+    Args:
+        results: MediaPipe pose results, one per person
+        sizes: (width, height) of the image each result came from. MediaPipe
+            normalises x and y to that image separately, so they are scaled
+            back to pixels to keep angles true on narrow person crops.
+    """
+    landmarks = np.full((len(results), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    for index, result in enumerate(results):
+        if result.pose_landmarks:
+            landmarks[index] = [(p.x, p.y, p.z, p.visibility) for p in result.pose_landmarks.landmark]
+    if sizes is not None:
+        landmarks[:, :, :2] *= np.asarray(sizes, dtype=np.float32).reshape(-1, 1, 2)
+    return landmarks
+
+def classify_l_pose(landmarks):
+    """
+    Classify every person at once: one arm straight down (or up) and the
+    other straight out to the side, both arms straight and visible.
     
-except ImportError as e:
-    print(f"❌ MediaPipe import failed: {e}")
-    print("📝 Note: MediaPipe may not be compatible with this environment")
-    print("🔄 Falling back to dummy pose detection")
-    MEDIAPIPE_AVAILABLE = False
-    mp_pose = None
-    mp_drawing = None
-    pose = None
-except Exception as e:
-    print(f"❌ MediaPipe initialization failed: {e}")
-    print("🔄 Falling back to dummy pose detection")
-    MEDIAPIPE_AVAILABLE = False
-    mp_pose = None
-    mp_drawing = None
-    pose = None
-
-def play_pose_alert_sound():
-    """Play pose alert sound in a separate thread to avoid blocking"""
-    try:
-        sound_path = "./static/audio/fire_alarm.mp3"
-        threading.Thread(target=playsound, args=(sound_path,), daemon=True).start()
-    except Exception as e:
-        print(f"Error playing pose alert sound: {e}")
-
-def calculate_angle(a, b, c):
-    if not MEDIAPIPE_AVAILABLE:
-        return 0
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    ba, bc = a - b, c - b
-    angle = np.degrees(np.arctan2(bc[1], bc[0]) - np.arctan2(ba[1], ba[0]))
-    angle = np.abs(angle)
-    return 360 - angle if angle > 180 else angle
-
-def get_arm_angle_vertical(shoulder, elbow):
-    if not MEDIAPIPE_AVAILABLE:
-        return 0
-    shoulder, elbow = np.array(shoulder), np.array(elbow)
-    vec = elbow - shoulder
-    angle_rad = math.atan2(vec[0], -vec[1])
-    return math.degrees(angle_rad)
-
-def detect_l_pose(frame):
-    if not MEDIAPIPE_AVAILABLE:
+    Args:
+        landmarks: (N, 33, 4) array of x, y, z, visibility per landmark,
+            with x and y in pixels (or any units equal on both axes)
+        
+    Returns:
+        np.ndarray: (N,) bool, True where the person shows an L-pose
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    arms = landmarks[:, ARM_JOINTS]  # (N, arm, joint, xyzv)
+    shoulder, elbow, wrist = arms[:, :, 0, :2], arms[:, :, 1, :2], arms[:, :, 2, :2]
+
+    # NaN compares False, so missing people are never visible
+    visible = (arms[..., 3] > MIN_VISIBILITY).all(axis=(1, 2))
+
+    # elbow angle between upper arm and forearm, folded into [0, 180]
+    upper, fore = shoulder - elbow, wrist - elbow
+    bend = np.degrees(np.abs(np.arctan2(fore[..., 1], fore[..., 0]) - np.arctan2(upper[..., 1], upper[..., 0])))
+    bend = np.where(bend > 180, 360 - bend, bend)
+    straight = (bend > STRAIGHT_ARM_THRESHOLD).all(axis=1)
+
+    # upper arm direction from straight down (0) through sideways (90) to up (180)
+    arm = elbow - shoulder
+    tilt = np.abs(np.degrees(np.arctan2(arm[..., 0], -arm[..., 1])))
+    vertical = (tilt <= VERTICAL_THRESH) | (np.abs(tilt - 180) <= VERTICAL_THRESH)
+    horizontal = np.abs(tilt - 90) <= HORIZONTAL_THRESH
+    l_shape = (vertical[:, 0] & horizontal[:, 1]) | (vertical[:, 1] & horizontal[:, 0])
+
+    return visible & straight & l_shape
+
+class pose_smoother:
+    """
+    Temporal vote over each person's recent classifications, so a single
+    frame's misfit landmarks does not raise an alert.
+    
+    A person counts as showing the L-pose once at least min_hits of their
+    last window classifications were positive. History is kept per camera
+    and per tracked person and dropped as soon as the person leaves.
+    """
+    def __init__(self, window=5, min_hits=3):
+        self.window = max(1, window)
+        self.min_hits = min(max(1, min_hits), self.window)
+        self._history = {}  # key -> {person_id: deque of bools}
+        self._lock = threading.Lock()
+
+    def update(self, key, person_ids, flags):
+        """
+        Add this frame's classification of every person in view.
+        
+        Returns:
+            list: smoothed decision per person, in the order given
+        """
+        with self._lock:
+            history = self._history.setdefault(key, {})
+            for gone in set(history) - set(person_ids):
+                del history[gone]
+            decisions = []
+            for person_id, flag in zip(person_ids, flags):
+                votes = history.get(person_id)
+                if votes is None:
+                    votes = history[person_id] = deque(maxlen=self.window)
+                votes.append(bool(flag))
+                decisions.append(sum(votes) >= self.min_hits)
+            return decisions
+
+def person_crops(boxes, shape, max_people=4, pad=0.15):
+    """
+    Padded, clipped crop boxes for the largest max_people person boxes, so
+    arms stretched past the detector's box stay inside the crop.
+    """
+    height, width = shape[:2]
+    boxes = sorted(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)[:max_people]
+    crops = []
+    for x1, y1, x2, y2 in boxes:
+        px, py = int((x2 - x1) * pad), int((y2 - y1) * pad)
+        crop = [max(0, x1 - px), max(0, y1 - py), min(width, x2 + px), min(height, y2 + py)]
+        if crop[2] - crop[0] > 1 and crop[3] - crop[1] > 1:
+            crops.append(crop)
+    return crops
+
+def detect_l_pose(frame, key=None, person_boxes=None, smoothing=None):
+    """
+    Detect the L-pose help signal, drawing landmarks and status on frame.
+    
+    Args:
+        frame: BGR frame, annotated in place
+        key: Camera identity, so each stream keeps its own pose tracking
+        person_boxes: Person boxes from the YOLO person detector; pose only
+            runs on these crops. None runs it on the whole frame.
+        smoothing: pose_smoother voting over recent frames, or None to
+            alert on a single frame
+            
+    Returns:
+        tuple: (frame, detected)
+    """
+    if not load_mediapipe():
         # Return original frame with clear status message
         cv2.putText(frame, "POSE DETECTION: DISABLED", 
                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 165, 255), 2)
@@ -74,58 +303,47 @@ def detect_l_pose(frame):
         return frame, False
     
     try:
-        image = cv2.flip(frame, 1)
-        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        rgb.flags.writeable = False
-        results = pose.process(rgb)
-        rgb.flags.writeable = True
-        frame = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
-
-        detected = False
-        
+        if person_boxes is None:
+            boxes = [[0, 0, frame.shape[1], frame.shape[0]]]
+        else:
+            boxes = person_crops(person_boxes, frame.shape, max_people=pose_estimators.max_people)
+
         # Add status indicator
         cv2.putText(frame, "POSE DETECTION: ACTIVE", 
                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        
-        if results.pose_landmarks:
-            lm = results.pose_landmarks.landmark
-            try:
-                ls, rs = lm[mp_pose.PoseLandmark.LEFT_SHOULDER.value], lm[mp_pose.PoseLandmark.RIGHT_SHOULDER.value]
-                le, re = lm[mp_pose.PoseLandmark.LEFT_ELBOW.value], lm[mp_pose.PoseLandmark.RIGHT_ELBOW.value]
-                lw, rw = lm[mp_pose.PoseLandmark.LEFT_WRIST.value], lm[mp_pose.PoseLandmark.RIGHT_WRIST.value]
-
-                visible = all(p.visibility > MIN_VISIBILITY for p in [ls, rs, le, re, lw, rw])
-                if visible:
-                    ls_c, rs_c = [ls.x, ls.y], [rs.x, rs.y]
-                    le_c, re_c = [le.x, le.y], [re.x, re.y]
-                    lw_c, rw_c = [lw.x, lw.y], [rw.x, rw.y]
-
-                    left_angle = calculate_angle(ls_c, le_c, lw_c)
-                    right_angle = calculate_angle(rs_c, re_c, rw_c)
-                    left_vert = get_arm_angle_vertical(ls_c, le_c)
-                    right_vert = get_arm_angle_vertical(rs_c, re_c)
-
-                    is_ls = left_angle > STRAIGHT_ARM_THRESHOLD
-                    is_rs = right_angle > STRAIGHT_ARM_THRESHOLD
-                    is_lv = abs(left_vert) <= VERTICAL_THRESH or abs(abs(left_vert) - 180) <= VERTICAL_THRESH
-                    is_rv = abs(right_vert) <= VERTICAL_THRESH or abs(abs(right_vert) - 180) <= VERTICAL_THRESH
-                    is_lh = abs(abs(left_vert) - 90) <= HORIZONTAL_THRESH
-                    is_rh = abs(abs(right_vert) - 90) <= HORIZONTAL_THRESH
-
-                    if (is_lv and is_rh and is_ls and is_rs) or (is_rv and is_lh and is_rs and is_ls):
-                        detected = True
-                        play_pose_alert_sound()  # Play alert sound when L-pose detected
-                        cv2.putText(frame, "L POSE DETECTED - EMERGENCY ALERT!", 
-                                   (50, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
-                        cv2.putText(frame, "HELP REQUESTED", 
-                                   (50, 160), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
-            except Exception as e:
-                print(f"Error processing landmarks: {e}")
-                cv2.putText(frame, "Pose processing error", 
-                           (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-
-        if mp_drawing and results.pose_landmarks:
-            mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+
+        # No person in view means nothing for MediaPipe to do
+        if not boxes:
+            if smoothing is not None:
+                smoothing.update(key, [], [])
+            return frame, False
+
+        crops = []
+        for x1, y1, x2, y2 in boxes:
+            rgb = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
+            rgb.flags.writeable = False
+            crops.append(rgb)
+        person_ids, results = pose_estimators.run(key, crops, boxes)
+
+        sizes = [(x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes]
+        flags = classify_l_pose(landmark_array(results, sizes))
+        if smoothing is not None:
+            flags = smoothing.update(key, person_ids, flags)
+        detected = bool(np.any(flags))
+
+        if mp_drawing:
+            for (x1, y1, x2, y2), results_person in zip(boxes, results):
+                if results_person.pose_landmarks:
+                    # landmarks are relative to the crop, so draw into the crop's view of frame
+                    mp_drawing.draw_landmarks(frame[y1:y2, x1:x2], results_person.pose_landmarks,
+                                              mp_pose.POSE_CONNECTIONS)
+
+        if detected:
+            play_pose_alert_sound()  # Play alert sound when L-pose detected
+            cv2.putText(frame, "L POSE DETECTED - EMERGENCY ALERT!", 
+                       (50, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
+            cv2.putText(frame, "HELP REQUESTED", 
+                       (50, 160), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
         
         return frame, detected
     
@@ -140,20 +358,16 @@ def detect_l_pose(frame):
 # Class wrapper to match gear/fire interface
 class pose_detection:
     def __init__(self, sound_path="./static/audio/fire_alarm.mp3"):
-        self.available = MEDIAPIPE_AVAILABLE
         self.sound_path = sound_path
-        
-        if self.available:
-            print("✅ Pose detection initialized successfully")
-        else:
-            print("⚠️  Pose detection initialized in fallback mode (MediaPipe unavailable)")
+
+    @property
+    def available(self):
+        """Whether MediaPipe loaded; the first access loads it"""
+        return load_mediapipe()
 
     def play_alert_sound(self):
-        """Play alert sound in a separate thread to avoid blocking"""
-        try:
-            threading.Thread(target=playsound, args=(self.sound_path,), daemon=True).start()
-        except Exception as e:
-            print(f"Error playing pose alert sound: {e}")
+        """Queue the alert sound on the shared, rate-limited audio dispatcher"""
+        play_pose_alert_sound(self.sound_path)
 
     def process(self, img, flag=False):
         if not flag:
@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+
+def letterbox(img, size=640, color=114, stride=None):
+    """
+    resize img keeping its aspect ratio so its longer side is size, the way
+    ultralytics prepares a frame for inference. it is padded to size x size,
+    as fixed-shape exports need, or with a stride only up to the next
+    multiple of it on each side, as PyTorch models take (a 640x480 frame
+    stays 640x480 instead of growing to 640x640).
+
+    Returns:
+    (padded image, scale, (left, top) padding in pixels)
+    """
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    new_width, new_height = round(width * scale), round(height * scale)
+    if (new_width, new_height) != (width, height):
+        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    if stride:
+        padded_width, padded_height = (-(-side // stride) * stride for side in (new_width, new_height))
+    else:
+        padded_width = padded_height = size
+    left, top = (padded_width - new_width) // 2, (padded_height - new_height) // 2
+    padded = cv2.copyMakeBorder(img, top, padded_height - new_height - top, left, padded_width - new_width - left,
+                                cv2.BORDER_CONSTANT, value=(color, color, color))
+    return padded, scale, (left, top)
+
+
+class model_input:
+    """
+    this class holds a captured frame letterboxed once to one model input
+    size, shared by every detector that runs at that size. since the image
+    already has the model's input shape, the model's own resize is a no-op.
+
+    Args:
+    frame: the frame as captured.
+    size: model input size, e.g. 640.
+    stride: pad only to a multiple of the model's stride (see letterbox),
+            or None to pad to a square for fixed-shape exports.
+    """
+    def __init__(self, frame, size, stride=None):
+        self.size = size
+        self.source_shape = frame.shape[:2]
+        self.image, self.scale, self.pad = letterbox(frame, size, stride=stride)
+
+    def to_display(self, data, display_shape):
+        """
+        map detections on the letterboxed image to a frame of display_shape.
+
+        Args:
+        data: (N, 6) array of x1, y1, x2, y2, conf, class.
+        display_shape: shape of the frame the boxes are drawn on.
+        """
+        data = np.array(data, dtype=np.float32).reshape(-1, 6)
+        height, width = self.source_shape
+        display_height, display_width = display_shape[:2]
+        scale_x = display_width / (width * self.scale)
+        scale_y = display_height / (height * self.scale)
+        data[:, [0, 2]] = ((data[:, [0, 2]] - self.pad[0]) * scale_x).clip(0, display_width)
+        data[:, [1, 3]] = ((data[:, [1, 3]] - self.pad[1]) * scale_y).clip(0, display_height)
+        return data
@@ -0,0 +1,283 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class local_backend:
+    """
+    runs every detector in the web process, through the detector's own
+    submit() (and so its batching engine, if enabled). inputs maps a model
+    input size to the model_input shared by the detectors of that size.
+    """
+    def submit(self, key, inputs, stages):
+        return [detector.submit(inputs[detector.imgsz].image) for _, detector in stages]
+
+    def close(self):
+        pass
+
+
+class remote_box:
+    """one detection, shaped like an ultralytics box so postprocess() works unchanged"""
+    def __init__(self, row):
+        self.xyxy = [row[:4]]
+        self.conf = [row[4]]
+        self.cls = [row[5]]
+
+
+class remote_result:
+    """detections computed in a worker process, shaped like an ultralytics result"""
+    def __init__(self, data):
+        self.data = data
+        self.boxes = [remote_box(row) for row in data]
+
+
+def detections(result):
+    """(N, 6) array of x1, y1, x2, y2, conf, class of an ultralytics or remote result"""
+    if isinstance(result, remote_result):
+        return result.data
+    return result.boxes.data.cpu().numpy()
+
+
+def _attach(name, attached):
+    shm = attached.get(name)
+    if shm is None:
+        # spawned workers share the web process's resource tracker, so the
+        # block is still unlinked exactly once, by its owner
+        shm = shared_memory.SharedMemory(name=name)
+        attached[name] = shm
+    return shm
+
+
+def _worker_main(model_paths, requests, results, max_batch, threads, ready):
+    """entry point of one inference process: load every model once, set ready, then serve requests"""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from ultralytics import YOLO
+
+    models = {name: YOLO(path, task="detect") for name, path in model_paths.items()}
+    attached = {}
+    ready.set()
+
+    while True:
+        batch = [requests.get()]
+        if batch[0] is None:
+            break
+        while len(batch) < max_batch:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                requests.put(None)
+                break
+            batch.append(request)
+
+        # a request holds one letterboxed image per input size, each with
+        # the names of the models that run on it
+        frames = {}
+        for request_id, parts in batch:
+            for shm_name, shape, names in parts:
+                image = np.ndarray(shape, dtype=np.uint8, buffer=_attach(shm_name, attached).buf)
+                for name in names:
+                    frames[request_id, name] = image
+
+        # one forward pass per model over every frame in the batch that needs it
+        output = {request_id: {} for request_id, _ in batch}
+        for name, model in models.items():
+            wanted = [request_id for request_id, _ in batch if (request_id, name) in frames]
+            if not wanted:
+                continue
+            try:
+                images = [frames[request_id, name] for request_id in wanted]
+                # the longer side of a letterboxed frame is the model's input size
+                predictions = model(images, verbose=False, imgsz=max(images[0].shape[:2]))
+                for request_id, prediction in zip(wanted, predictions):
+                    output[request_id][name] = prediction.boxes.data.cpu().numpy()
+            except Exception as e:
+                for request_id in wanted:
+                    output[request_id][name] = e
+
+        frames.clear()
+        for request_id, detections in output.items():
+            results.put((request_id, detections))
+
+    for shm in attached.values():
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+class process_backend:
+    """
+    this class shards cameras across a pool of inference processes, each of
+    which loads every model once. frames travel through one shared memory
+    block per camera and model input size instead of being pickled, and only the detections
+    (a few floats per box) come back to the web process.
+
+    Args:
+    model_paths: dict of alert name -> YOLO weights, e.g.
+                 {"fire_detection": "models/fire.pt"}.
+    workers: number of inference processes.
+    max_batch: maximum frames one process runs through a model at once.
+    """
+    def __init__(self, model_paths, workers=None, max_batch=8):
+        self.model_paths = dict(model_paths)
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 4)
+        self.max_batch = max_batch
+        self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._requests = []
+        self._processes = []
+        self._ready = []     # per worker, set once it has loaded its models
+        self._pending = {}   # request id -> (worker index, {name: future}, camera key)
+        self._busy = set()   # camera keys whose buffers a queued request still reads
+        self._buffers = {}   # (camera key, input size) -> SharedMemory
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._closed = False
+
+        for index in range(self.workers):
+            self._requests.append(self._ctx.Queue())
+            self._processes.append(None)
+            self._ready.append(None)
+            self._start_worker(index)
+
+        self._collector = threading.Thread(target=self._collect, name="process-backend", daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, index):
+        ready = self._ctx.Event()
+        process = self._ctx.Process(target=_worker_main, name=f"inference-{index}", daemon=True,
+                                    args=(self.model_paths, self._requests[index], self._results,
+                                          self.max_batch, self.threads, ready))
+        process.start()
+        self._ready[index] = ready
+        self._processes[index] = process
+
+    def wait_ready(self):
+        """
+        block until every worker process has loaded its models; raises
+        RuntimeError if one exits first (it is restarted, so a later call
+        can wait again)
+        """
+        for index in range(self.workers):
+            while not self._ready[index].wait(timeout=0.5):
+                if not self._processes[index].is_alive() and not self._ready[index].is_set():
+                    raise RuntimeError(f"Inference process {index} exited while loading its models")
+
+    def _shard(self, key):
+        return zlib.crc32(repr(key).encode()) % self.workers
+
+    def _buffer(self, key, frame):
+        shm = self._buffers.get(key)
+        if shm is None or shm.size < frame.nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            self._buffers[key] = shm
+        return shm
+
+    def submit(self, key, inputs, stages):
+        """
+        run the stages' models in the camera's worker process, each on the
+        model_input in inputs of its detector's input size. a camera's frame
+        buffers are reused, so while its previous request is still queued
+        (e.g. its futures timed out) the new frame's futures fail at once
+        instead of overwriting the frame the worker is about to read.
+        """
+        futures = {name: Future() for name, _ in stages}
+        if not futures:
+            return []
+
+        by_size = {}
+        for name, detector in stages:
+            by_size.setdefault(detector.imgsz, []).append(name)
+
+        index = self._shard(key)
+        parts = []
+        with self._lock:
+            if key in self._busy:
+                for future in futures.values():
+                    future.set_exception(RuntimeError("Previous frame is still being inferred"))
+                return [futures[name] for name, _ in stages]
+            for size, names in by_size.items():
+                image = np.ascontiguousarray(inputs[size].image, dtype=np.uint8)
+                shm = self._buffer((key, size), image)
+                np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf)[...] = image
+                parts.append((shm.name, image.shape, names))
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (index, futures, key)
+            self._busy.add(key)
+        self._requests[index].put((request_id, parts))
+        return [futures[name] for name, _ in stages]
+
+    def _fail_worker(self, index):
+        with self._lock:
+            lost = [request_id for request_id, (worker, _, _) in self._pending.items() if worker == index]
+            futures = []
+            for request_id in lost:
+                _, by_name, key = self._pending.pop(request_id)
+                self._busy.discard(key)
+                futures.append(by_name)
+        for by_name in futures:
+            for future in by_name.values():
+                future.set_exception(RuntimeError(f"Inference process {index} died"))
+
+    def _check_workers(self):
+        for index, process in enumerate(self._processes):
+            if not self._closed and not process.is_alive():
+                print(f"Inference process {index} exited, restarting it")
+                self._fail_worker(index)
+                self._start_worker(index)
+
+    def _collect(self):
+        # checked on a timer, since under load results keep arriving from
+        # the other workers while one of them is dead
+        next_check = time.monotonic() + 1.0
+        while not self._closed:
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + 1.0
+            try:
+                request_id, detections = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                _, futures, key = self._pending.pop(request_id, (None, {}, None))
+                self._busy.discard(key)
+            for name, future in futures.items():
+                data = detections.get(name)
+                if isinstance(data, Exception):
+                    future.set_exception(data)
+                else:
+                    future.set_result(remote_result(data if data is not None else []))
+
+    def close(self):
+        self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        with self._lock:
+            for shm in self._buffers.values():
+                shm.close()
+                shm.unlink()
+            self._buffers.clear()
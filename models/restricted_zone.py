@@ -1,16 +1,18 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
-from playsound import playsound
 import threading
+from models.audio_dispatcher import alert_sounds
+from models.inference_engine import inference_engine
+from models.zones import blend_overlay, blend_regions
 
 class restricted_zone_detection:
     """
     This class detects persons entering restricted areas using YOLO person detection.
-    It monitors the entire camera POV and triggers alerts when persons are detected.
+    It monitors a camera's zone polygons (see models.zones), or the entire camera
+    POV when none are set, and triggers alerts when persons are detected in them.
     """
     
-    def __init__(self, model_path="yolov8n.pt", conf=0.5, sound_path="./static/audio/fire_alarm.mp3"):
+    def __init__(self, model_path="yolov8n.pt", conf=0.5, sound_path="./static/audio/fire_alarm.mp3", imgsz=640):
         """
         Initialize the restricted zone detection model.
         
@@ -18,18 +20,59 @@ class restricted_zone_detection:
             model_path: Path to YOLO model (uses YOLOv8 nano for person detection)
             conf: Confidence threshold for person detection
             sound_path: Path to alert sound file
+            imgsz: Model input size; smaller is faster but misses distant people
         """
-        self.model = YOLO(model_path)
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self._model = None
+        self._model_lock = threading.Lock()
         self.confidence = conf
         self.sound_path = sound_path
         self.person_class_id = 0  # COCO dataset class ID for 'person'
+        self.engine = None
+        self._overlay_cache = {}  # (height, width) -> pre-blended overlay pixels
+
+    @property
+    def model(self):
+        """
+        YOLO person detector, loaded on first use so only processes that
+        actually run inference pay for it.
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    # importing ultralytics pulls in torch, so it waits for the first load too
+                    from ultralytics import YOLO
+                    # task is required for exported (ONNX/OpenVINO) models
+                    self._model = YOLO(self.model_path, task="detect")
+        return self._model
+
+    def enable_batching(self, max_batch=8, max_wait=0.01):
+        """
+        Route inference through a shared engine that batches frames from
+        all cameras into one forward pass.
+        
+        Args:
+            max_batch: Maximum number of frames per forward pass
+            max_wait: Maximum seconds a frame waits for the batch to fill
+        """
+        self.engine = inference_engine(lambda: self.model, max_batch=max_batch, max_wait=max_wait,
+                                       imgsz=self.imgsz)
+
+    def submit(self, img):
+        """
+        Queue a frame for person detection.
+        
+        Returns:
+            Future resolving to the raw YOLO result for img
+        """
+        if self.engine is None:
+            return inference_engine.run_now(self.model, img, self.imgsz)
+        return self.engine.submit(img)
         
     def play_alert_sound(self):
-        """Play alert sound in a separate thread to avoid blocking"""
-        try:
-            threading.Thread(target=playsound, args=(self.sound_path,), daemon=True).start()
-        except Exception as e:
-            print(f"Error playing restricted zone alert sound: {e}")
+        """Queue the alert sound on the shared, rate-limited audio dispatcher"""
+        alert_sounds.play("restricted_zone_breach", self.sound_path)
 
     def process(self, img, flag=True):
         """
@@ -45,46 +88,85 @@ class restricted_zone_detection:
         if not flag:
             return (False, [])
 
+        try:
+            # Run YOLO detection
+            result = self.submit(img).result()
+        except Exception as e:
+            print(f"Error in restricted zone detection: {e}")
+            return (False, [])
+
+        return self.postprocess(img, result)
+
+    def persons(self, result):
+        """
+        Person boxes in a YOLO result, without drawing or alerting.
+        
+        Args:
+            result: Single ultralytics result
+            
+        Returns:
+            list: [x1, y1, x2, y2] for every confident person detection
+        """
+        return [list(map(int, box.xyxy[0])) for box in result.boxes
+                if int(box.cls[0]) == self.person_class_id and float(box.conf[0]) > self.confidence]
+
+    def postprocess(self, img, result, zones=None):
+        """
+        Turn a YOLO result into restricted zone breaches and annotate img.
+        
+        Args:
+            img: Frame the result was computed on
+            result: Single ultralytics result for img
+            zones: Camera's zone_set; only persons inside a zone breach it.
+                   None (or no zones) treats the entire frame as restricted
+            
+        Returns:
+            tuple: (detection_found, bounding_boxes_list)
+        """
         bb_boxes = []
         
         try:
-            # Run YOLO detection
-            results = self.model(img, verbose=False)
+            # Confident person detections
+            people = [box for box in result.boxes
+                      if int(box.cls[0]) == self.person_class_id and float(box.conf[0]) > self.confidence]
+            if zones:
+                # every person against every zone in one pass
+                zone_ids = zones.inside([list(map(float, box.xyxy[0])) for box in people], img.shape)
+            else:
+                zone_ids = [None] * len(people)
             
-            # Process detections
-            for box in results[0].boxes:
-                # Check if detection is a person and meets confidence threshold
-                if (int(box.cls[0]) == self.person_class_id and 
-                    float(box.conf[0]) > self.confidence):
+            for box, zone_id in zip(people, zone_ids):
+                if zone_id == 0:
+                    continue
                     
-                    # Extract bounding box coordinates
-                    bb = list(map(int, box.xyxy[0]))
-                    bb_boxes.append(bb)
-                    
-                    # Draw bounding box on the image
-                    x1, y1, x2, y2 = bb
-                    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    
-                    # Add warning text
-                    cv2.putText(img, "RESTRICTED AREA BREACH!", 
-                              (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 
-                              0.7, (0, 0, 255), 2)
-                    
-                    # Add confidence score
-                    confidence_text = f"Person: {float(box.conf[0]):.2f}"
-                    cv2.putText(img, confidence_text, 
-                              (x1, y2 + 20), cv2.FONT_HERSHEY_SIMPLEX, 
-                              0.5, (0, 0, 255), 1)
+                # Extract bounding box coordinates
+                bb = list(map(int, box.xyxy[0]))
+                bb_boxes.append(bb)
+                
+                # Draw bounding box on the image
+                x1, y1, x2, y2 = bb
+                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 3)
+                
+                # Add warning text
+                label = "RESTRICTED AREA BREACH!" if zone_id is None else f"ZONE {zone_id} BREACH!"
+                cv2.putText(img, label, 
+                          (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 
+                          0.7, (0, 0, 255), 2)
+                
+                # Add confidence score
+                confidence_text = f"Person: {float(box.conf[0]):.2f}"
+                cv2.putText(img, confidence_text, 
+                          (x1, y2 + 20), cv2.FONT_HERSHEY_SIMPLEX, 
+                          0.5, (0, 0, 255), 1)
 
             # If persons detected, trigger alert
             if len(bb_boxes) > 0:
                 found = True
                 self.play_alert_sound()
                 
-                # Add overall warning overlay
-                overlay = img.copy()
-                cv2.rectangle(overlay, (0, 0), (img.shape[1], 50), (0, 0, 255), -1)
-                cv2.addWeighted(overlay, 0.3, img, 0.7, 0, img)
+                # Add overall warning overlay (only the banner strip is blended)
+                banner = img[:51]
+                cv2.addWeighted(np.full_like(banner, (0, 0, 255)), 0.3, banner, 0.7, 0, banner)
                 cv2.putText(img, f"ALERT: {len(bb_boxes)} PERSON(S) IN RESTRICTED ZONE", 
                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
             else:
@@ -96,39 +178,62 @@ class restricted_zone_detection:
             
         return (found, bb_boxes)
 
-    def draw_zone_overlay(self, img):
+    def _build_zone_overlay(self, height, width):
         """
-        Draw a semi-transparent overlay to indicate the entire frame is a restricted zone.
+        Rasterize the zone overlay once for a frame size.
         
-        Args:
-            img: Input image
-            
         Returns:
-            img: Image with zone overlay
+            list: (region, keep, add, colour) per covered rectangle, where keep
+            and add are the per-pixel frame and overlay weights of the 0.1 blend
         """
-        overlay = img.copy()
+        mask = np.zeros((height, width), dtype=np.uint8)
         
         # Draw border around entire frame
-        cv2.rectangle(overlay, (5, 5), (img.shape[1]-5, img.shape[0]-5), (0, 255, 255), 3)
+        cv2.rectangle(mask, (5, 5), (width-5, height-5), 255, 3)
         
         # Add corner markers
         corner_size = 30
         corners = [
-            (10, 10), (img.shape[1]-40, 10),
-            (10, img.shape[0]-40), (img.shape[1]-40, img.shape[0]-40)
+            (10, 10), (width-40, 10),
+            (10, height-40), (width-40, height-40)
         ]
         
         for corner in corners:
-            cv2.rectangle(overlay, corner, 
+            cv2.rectangle(mask, corner, 
                          (corner[0] + corner_size, corner[1] + corner_size), 
-                         (0, 255, 255), -1)
+                         255, -1)
         
         # Add zone label
-        cv2.putText(overlay, "RESTRICTED ZONE - MONITORING ACTIVE", 
-                   (10, img.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 
-                   0.6, (0, 255, 255), 2)
+        cv2.putText(mask, "RESTRICTED ZONE - MONITORING ACTIVE", 
+                   (10, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 
+                   0.6, 255, 2)
+        
+        # Coverage is 0-255, so anti-aliased edges blend like the drawn overlay
+        return blend_regions(mask, (0, 255, 255), 0.1)
+
+    def draw_zone_overlay(self, img, zones=None):
+        """
+        Draw a semi-transparent overlay of the camera's zones, or indicating
+        the entire frame is a restricted zone when it has none.
+        
+        The overlay is rasterized once per frame size; each call only blends
+        the pixels it covers instead of copying and blending the whole frame.
+        
+        Args:
+            img: Input image
+            zones: Camera's zone_set, or None
+            
+        Returns:
+            img: Image with zone overlay
+        """
+        if zones:
+            return zones.draw(img)
         
-        # Blend overlay with original image
-        cv2.addWeighted(overlay, 0.1, img, 0.9, 0, img)
+        key = img.shape[:2]
+        cached = self._overlay_cache.get(key)
+        if cached is None:
+            cached = self._build_zone_overlay(*key)
+            self._overlay_cache[key] = cached
         
-        return img
\ No newline at end of file
+        # Blend overlay with original image (0.1 overlay, 0.9 image)
+        return blend_overlay(img, cached)
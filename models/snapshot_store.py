@@ -0,0 +1,78 @@
+import hashlib
+import os
+import re
+import threading
+
+import cv2
+import numpy as np
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class snapshot_store:
+    """
+    this class keeps alert snapshots as JPEG files on disk, addressed by the
+    sha256 of their content, next to a thumbnail generated at write time.
+    identical snapshots are stored once.
+
+    Args:
+    root: directory holding the store.
+    thumb_width: width of the generated thumbnails in pixels.
+    jpeg_quality: quality used when encoding frames.
+    """
+    def __init__(self, root, thumb_width=320, jpeg_quality=90):
+        self.root = root
+        self.thumb_width = thumb_width
+        self.jpeg_quality = jpeg_quality
+
+    @staticmethod
+    def valid_key(key):
+        return bool(key) and KEY_PATTERN.match(key) is not None
+
+    def path(self, key, thumb=False):
+        if not self.valid_key(key):
+            raise ValueError(f"Invalid snapshot key: {key!r}")
+        name = f"{key}_thumb.jpg" if thumb else f"{key}.jpg"
+        return os.path.join(self.root, key[:2], key[2:4], name)
+
+    def _write(self, path, data):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        if width > self.thumb_width:
+            size = (self.thumb_width, max(1, round(height * self.thumb_width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])[1].tobytes()
+
+    def put(self, frame):
+        """encode a frame and store it with its thumbnail; returns the key"""
+        data = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])[1].tobytes()
+        return self._put(data, frame)
+
+    def put_bytes(self, data):
+        """store an already encoded JPEG (e.g. a legacy BLOB); returns the key"""
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Snapshot is not a decodable image")
+        return self._put(data, frame)
+
+    def _put(self, data, frame):
+        key = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self.path(key, thumb=True)):
+            self._write(self.path(key, thumb=True), self._thumbnail(frame))
+        self._write(self.path(key), data)
+        return key
+
+    def delete(self, key):
+        for thumb in (False, True):
+            try:
+                os.remove(self.path(key, thumb=thumb))
+            except FileNotFoundError:
+                pass
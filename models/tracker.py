@@ -0,0 +1,149 @@
+import numpy as np
+
+from models.model_export import match_detections
+
+# Kalman noise as a fraction of the box height, as in ByteTrack
+POSITION_NOISE = 1 / 20
+VELOCITY_NOISE = 1 / 160
+
+
+class kalman_track:
+    """
+    one tracked object: a constant-velocity Kalman filter over the box
+    centre, width and height.
+
+    Args:
+    track_id: id of the track, stable for the object's lifetime.
+    row: the detection that started the track (x1, y1, x2, y2, conf, class).
+    """
+    _F = np.eye(8) + np.eye(8, k=4)
+    _H = np.eye(4, 8)
+
+    def __init__(self, track_id, row):
+        self.track_id = track_id
+        self.cls = row[5]
+        self.conf = row[4]
+        self.hits = 1
+        self.lost = 0  # keyframes since the track was last matched
+        self.alerted = False
+        self.x = np.concatenate([self._measure(row), np.zeros(4)])
+        height = self.x[3]
+        self.P = np.diag(np.square([2 * POSITION_NOISE * height] * 4 + [10 * VELOCITY_NOISE * height] * 4))
+
+    @staticmethod
+    def _measure(row):
+        x1, y1, x2, y2 = row[:4]
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=float)
+
+    def predict(self):
+        height = max(self.x[3], 1.0)
+        Q = np.diag(np.square([POSITION_NOISE * height] * 4 + [VELOCITY_NOISE * height] * 4))
+        self.x = self._F @ self.x
+        self.x[2:4] = np.maximum(self.x[2:4], 1.0)
+        self.P = self._F @ self.P @ self._F.T + Q
+
+    def update(self, row, high_conf):
+        R = np.diag(np.square([POSITION_NOISE * max(self.x[3], 1.0)] * 4))
+        S = self._H @ self.P @ self._H.T + R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (self._measure(row) - self._H @ self.x)
+        self.P = (np.eye(8) - K @ self._H) @ self.P
+        if row[4] >= high_conf:
+            # low-confidence matches keep the track alive without lowering its score
+            self.conf = row[4]
+        self.hits += 1
+        self.lost = 0
+
+    def row(self):
+        cx, cy, w, h = self.x[:4]
+        return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2, self.conf, self.cls, self.track_id]
+
+
+class box_tracker:
+    """
+    this class follows detections across frames so a model only has to run
+    on keyframes. like ByteTrack, confident detections are matched to the
+    tracks first and the remaining low-confidence ones can only extend
+    existing tracks, which keeps people tracked through partial occlusion
+    without starting tracks on noise. between keyframes predict() moves
+    every track along its estimated velocity.
+
+    Args:
+    high_conf: detections at or above this start tracks and are matched first.
+    low_conf: detections below this are ignored.
+    match_iou: minimum IoU between a track's prediction and a detection.
+    max_lost: keyframes a track survives without a match.
+    min_hits: keyframe matches before a track may raise an alert.
+    """
+    def __init__(self, high_conf=0.5, low_conf=0.1, match_iou=0.3, max_lost=3, min_hits=2):
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.match_iou = match_iou
+        self.max_lost = max_lost
+        self.min_hits = min_hits
+        self.tracks = []
+        self._next_id = 1
+
+    def _rows(self, tracks):
+        return np.array([track.row() for track in tracks], dtype=float).reshape(-1, 7)
+
+    def _match(self, tracks, rows):
+        """pair tracks with detections of the same class, returning the unmatched detections"""
+        if not tracks or not len(rows):
+            return tracks, rows
+        pairs = match_detections(self._rows(tracks)[:, :6], rows, iou=self.match_iou)
+        for track_index, row_index in pairs:
+            tracks[track_index].update(rows[row_index], self.high_conf)
+        matched_tracks = {track_index for track_index, _ in pairs}
+        matched_rows = [row_index for _, row_index in pairs]
+        return ([track for index, track in enumerate(tracks) if index not in matched_tracks],
+                np.delete(rows, matched_rows, axis=0))
+
+    def update(self, detections):
+        """
+        match a keyframe's detections to the tracks.
+
+        Args:
+        detections: (N, 6) array of x1, y1, x2, y2, conf, class.
+
+        Returns:
+        (M, 7) array of the tracks matched on this keyframe, with the track
+        id in the last column.
+        """
+        detections = np.asarray(detections, dtype=float).reshape(-1, 6)
+        for track in self.tracks:
+            track.predict()
+        high = detections[detections[:, 4] >= self.high_conf]
+        low = detections[(detections[:, 4] >= self.low_conf) & (detections[:, 4] < self.high_conf)]
+
+        unmatched, new_rows = self._match(self.tracks, high)
+        unmatched, _ = self._match(unmatched, low)
+        for track in unmatched:
+            track.lost += 1
+        self.tracks = [track for track in self.tracks if track.lost <= self.max_lost]
+        for row in new_rows:
+            self.tracks.append(kalman_track(self._next_id, row))
+            self._next_id += 1
+        return self.current()
+
+    def predict(self):
+        """advance every track by one frame and return the ones seen on the last keyframe"""
+        for track in self.tracks:
+            track.predict()
+        return self.current()
+
+    def current(self):
+        return self._rows([track for track in self.tracks if track.lost == 0])
+
+    def claim_alerts(self, track_ids):
+        """
+        ids among track_ids of confirmed tracks that have not alerted yet;
+        they are marked alerted, so each tracked object alerts once.
+        """
+        wanted = set(track_ids)
+        claimed = []
+        for track in self.tracks:
+            if track.track_id in wanted and not track.alerted and track.hits >= self.min_hits:
+                track.alerted = True
+                claimed.append(track.track_id)
+        return claimed
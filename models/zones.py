@@ -0,0 +1,175 @@
+import json
+import threading
+
+import cv2
+import numpy as np
+
+ZONE_COLOUR = (0, 255, 255)
+ZONE_CHECKS = ("foot", "overlap")
+MAX_ZONES = 255  # zone labels are stored in a uint8 mask
+
+
+def parse_zones(text):
+    """
+    parse a camera's zones from JSON: a list of polygons, each a list of
+    [x, y] points relative to the frame (0..1), e.g.
+    [[[0.1, 0.5], [0.6, 0.5], [0.6, 1], [0.1, 1]]]. raises ValueError.
+    """
+    if not text or not text.strip():
+        return []
+    try:
+        polygons = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Zones are not valid JSON: {e}")
+    if not isinstance(polygons, list) or len(polygons) > MAX_ZONES:
+        raise ValueError(f"Zones must be a list of at most {MAX_ZONES} polygons")
+    parsed = []
+    for polygon in polygons:
+        try:
+            points = np.array(polygon, dtype=float)
+        except (TypeError, ValueError):
+            raise ValueError("Each zone must be a list of [x, y] points")
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            raise ValueError("Each zone needs at least 3 [x, y] points")
+        if not np.isfinite(points).all() or points.min() < 0 or points.max() > 1:
+            raise ValueError("Zone points are fractions of the frame, between 0 and 1")
+        parsed.append(points.tolist())
+    return parsed
+
+
+def covered_regions(mask, tile=16):
+    """
+    split the drawn pixels of a mask into a few disjoint rectangles, so
+    blending only touches the drawn parts instead of the whole frame.
+
+    Returns:
+    list of (y0, y1, x0, x1) rectangles covering every non-zero pixel.
+    """
+    h, w = mask.shape
+    gh, gw = -(-h // tile), -(-w // tile)
+    padded = np.zeros((gh * tile, gw * tile), dtype=bool)
+    padded[:h, :w] = mask > 0
+    grid = padded.reshape(gh, tile, gw, tile).any(axis=(1, 3))
+
+    regions = []
+    open_runs = {}  # (gx0, gx1) -> first grid row of the run
+    for gy in range(gh + 1):
+        runs = set()
+        if gy < gh:
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], grid[gy].astype(np.int8), [0]))))
+            runs = set(zip(edges[::2], edges[1::2]))
+        for run in list(open_runs):
+            if run not in runs:
+                start = open_runs.pop(run)
+                regions.append((start * tile, min(gy * tile, h), run[0] * tile, min(run[1] * tile, w)))
+        for run in runs:
+            open_runs.setdefault(run, gy)
+    return regions
+
+
+def blend_regions(mask, colour, opacity):
+    """
+    precompute the blend of colour over the pixels of a coverage mask
+    (0-255, so anti-aliased edges blend partially).
+
+    Returns:
+    list of (region, keep, add, colour) per covered rectangle, as
+    blend_overlay() takes them.
+    """
+    regions = []
+    for y0, y1, x0, x1 in covered_regions(mask):
+        weight = mask[y0:y1, x0:x1].astype(np.float32) / 255 * opacity
+        fill = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        fill[:] = colour
+        regions.append(((slice(y0, y1), slice(x0, x1)), 1 - weight, weight, fill))
+    return regions
+
+
+def blend_overlay(img, regions):
+    for region, keep, add, fill in regions:
+        roi = img[region]
+        roi[:] = cv2.blendLinear(roi, fill, keep, add)
+    return img
+
+
+class zone_set:
+    """
+    this class holds one camera's restricted zones. the polygons are
+    rasterized once per frame size into a label mask, its integral image
+    and the overlay, so checking people against dozens of zones is a few
+    array lookups per frame.
+
+    Args:
+    polygons: zones as lists of [x, y] points relative to the frame.
+    check: "foot" flags a person whose foot point (bottom centre of the box)
+           is inside a zone, "overlap" one whose box overlaps the zones by
+           at least min_overlap of its area.
+    min_overlap: fraction of the box area for the "overlap" check.
+    """
+    def __init__(self, polygons, check="foot", min_overlap=0.3):
+        if check not in ZONE_CHECKS:
+            raise ValueError(f"Zone check must be one of {', '.join(ZONE_CHECKS)}")
+        self.polygons = [np.array(polygon, dtype=float) for polygon in polygons]
+        self.check = check
+        self.min_overlap = min_overlap
+        self._cache = {}  # (height, width) -> (labels, integral, overlay regions)
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.polygons)
+
+    def _rasterize(self, shape):
+        key = tuple(shape[:2])
+        cached = self._cache.get(key)
+        if cached is None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is None:
+                    cached = self._cache[key] = self._build(*key)
+        return cached
+
+    def _build(self, height, width):
+        scale = np.array([width - 1, height - 1])
+        points = [np.round(polygon * scale).astype(np.int32) for polygon in self.polygons]
+
+        labels = np.zeros((height, width), dtype=np.uint8)
+        for index, polygon in enumerate(points):
+            cv2.fillPoly(labels, [polygon], index + 1)
+        integral = cv2.integral((labels > 0).astype(np.uint8))
+
+        # a light fill with a solid outline and the zone number
+        coverage = np.where(labels > 0, 64, 0).astype(np.uint8)
+        cv2.polylines(coverage, points, True, 255, 2, cv2.LINE_AA)
+        for index, polygon in enumerate(points):
+            x, y = polygon.min(axis=0)
+            cv2.putText(coverage, f"ZONE {index + 1}", (int(x) + 5, int(y) + 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, 255, 1, cv2.LINE_AA)
+        return labels, integral, blend_regions(coverage, ZONE_COLOUR, 0.5)
+
+    def inside(self, boxes, shape):
+        """
+        zone number (1-based) each box breaches, 0 for none.
+
+        Args:
+        boxes: (N, 4) x1, y1, x2, y2 in the pixels of a frame of shape.
+        shape: shape of the frame the boxes are on.
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        labels, integral, _ = self._rasterize(shape)
+        height, width = labels.shape
+        x1, x2 = (np.clip(boxes[:, i], 0, width - 1).astype(int) for i in (0, 2))
+        y1, y2 = (np.clip(boxes[:, i], 0, height - 1).astype(int) for i in (1, 3))
+        zone = labels[y2, (x1 + x2) // 2].astype(int)
+        if self.check == "overlap":
+            covered = (integral[y2 + 1, x2 + 1] - integral[y1, x2 + 1]
+                       - integral[y2 + 1, x1] + integral[y1, x1])
+            area = (x2 - x1 + 1) * (y2 - y1 + 1)
+            overlapping = covered >= self.min_overlap * area
+            # the zone under the box centre names breaches whose feet are outside
+            centre = labels[(y1 + y2) // 2, (x1 + x2) // 2].astype(int)
+            zone = np.where(overlapping, np.where(zone > 0, zone, np.maximum(centre, 1)), 0)
+        return zone
+
+    def draw(self, img):
+        """blend the zones' cached overlay into img in place"""
+        return blend_overlay(img, self._rasterize(img.shape)[2])
@@ -3,3 +3,70 @@ const hamBurger = document.querySelector(".toggle-btn");
 hamBurger.addEventListener("click", function () {
   document.querySelector("#sidebar").classList.toggle("expand");
 });
+
+// Live feeds: thumbnails in a grid, one camera at full quality on click.
+// Only one tier streams at a time: the thumbnails pause while a camera is
+// open full-screen and resume when it is closed.
+const liveFeeds = document.querySelector("#live-feeds");
+const fullscreen = document.querySelector("#feed-fullscreen");
+const useWebSocket = liveFeeds && liveFeeds.dataset.websocket === "true";
+const sockets = new Map();
+
+function streamTo(img, camId, tier) {
+  if (!useWebSocket) {
+    img.src = `/video_feed/${camId}?tier=${tier}`;
+    return;
+  }
+  const scheme = location.protocol === "https:" ? "wss" : "ws";
+  const ws = new WebSocket(`${scheme}://${location.host}/ws/video_feed/${camId}?tier=${tier}`);
+  ws.binaryType = "blob";
+  ws.onmessage = (event) => {
+    const previous = img.src;
+    img.src = URL.createObjectURL(event.data);
+    if (previous.startsWith("blob:")) URL.revokeObjectURL(previous);
+  };
+  sockets.set(img, ws);
+}
+
+function stopStream(img) {
+  const ws = sockets.get(img);
+  if (ws) {
+    ws.close();
+    sockets.delete(img);
+  }
+  if (img.src.startsWith("blob:")) URL.revokeObjectURL(img.src);
+  // an empty src aborts a running MJPEG request, removing it alone may not
+  img.src = "";
+  img.removeAttribute("src");
+}
+
+if (fullscreen) {
+  const fullImg = document.querySelector("#feed-fullscreen-img");
+  const grid = document.querySelector(".feed-grid");
+  const tiles = document.querySelectorAll(".feed-tile");
+
+  const streamThumbs = () =>
+    tiles.forEach((tile) => streamTo(tile.querySelector("img"), tile.dataset.cam, "thumb"));
+  const stopThumbs = () => tiles.forEach((tile) => stopStream(tile.querySelector("img")));
+
+  if (useWebSocket) {
+    stopThumbs();
+    streamThumbs();
+  }
+  tiles.forEach((tile) => {
+    tile.addEventListener("click", () => {
+      stopThumbs();
+      document.querySelector("#feed-fullscreen-title").textContent = `Camera: ${tile.dataset.cam}`;
+      streamTo(fullImg, tile.dataset.cam, "full");
+      grid.classList.add("d-none");
+      fullscreen.classList.remove("d-none");
+    });
+  });
+
+  document.querySelector("#feed-fullscreen-close").addEventListener("click", () => {
+    stopStream(fullImg);
+    fullscreen.classList.add("d-none");
+    grid.classList.remove("d-none");
+    streamThumbs();
+  });
+}